@@ -1,15 +1,12 @@
 import streamlit as st
-import osmnx as ox
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
 from geopy.geocoders import Nominatim, ArcGIS
 import os
 import requests
 import re # 用于检测是不是坐标格式
+from render_worker import JobQueue
 
 # --- 1. 基础配置 ---
-ox.settings.user_agent = "art-map-poster/13.0"
-ox.settings.requests_timeout = 60
+USER_AGENT = "art-map-poster/13.0"
 
 st.set_page_config(page_title="艺术地图海报工坊", layout="wide")
 
@@ -26,9 +23,21 @@ def get_chinese_font():
                     f.write(response.content)
         except:
             return None
-    return fm.FontProperties(fname=font_name)
+    return font_name
 
-zh_font = get_chinese_font()
+zh_font_path = get_chinese_font()
+
+# 渲染在后台工作进程中进行，所有会话共用一个队列
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(user_agent=USER_AGENT)
+
+STAGE_LABELS = {
+    "queued": "⏳ 排队中...",
+    "downloading": "💾 正在下载数据...",
+    "rendering": "🎨 正在渲染...",
+    "saving": "💾 正在保存...",
+}
 
 # --- 3. 主题配置 ---
 THEMES = {
@@ -52,14 +61,6 @@ def get_location(city_name):
     except:
         return None, None
 
-@st.cache_data(show_spinner=False)
-def get_map_data(point, radius, network_type):
-    return ox.graph_from_point(point, dist=radius, dist_type='bbox', network_type=network_type, retain_all=True)
-
-def space_out_text(text, spacing=1):
-    if not text: return ""
-    return (" " * spacing).join(list(text))
-
 def format_coords(lat, lon):
     ns = "N" if lat >= 0 else "S"
     ew = "E" if lon >= 0 else "W"
@@ -79,29 +80,27 @@ def is_coordinate_format(text):
     # 如果包含数字和 ° 符号，或者 N/S/E/W，就认为是自动生成的坐标
     return any(char.isdigit() for char in text) and ("°" in text or "/" in text)
 
-# --- 5. 绘图逻辑 ---
-def render_poster(G, theme_key, city_text, sub_text):
-    theme = THEMES[theme_key]
-    fig, ax = ox.plot_graph(
-        G, node_size=0, edge_color=theme["edge"], edge_linewidth=0.4,
-        bgcolor=theme["bg"], figsize=(12, 16), show=False, close=False
-    )
-    
-    font_prop = zh_font if zh_font else None
-    
-    # 主标题
-    ax.text(0.5, 0.12, space_out_text(city_text, 1), transform=ax.transAxes, 
-            ha='center', va='center', fontsize=40, color=theme["text"], 
-            fontproperties=font_prop, alpha=0.9)
-    
-    # 副标题
-    if sub_text and sub_text.strip() != "":
-        ax.text(0.5, 0.08, space_out_text(sub_text, 1), transform=ax.transAxes, 
-                ha='center', va='center', fontsize=12, color=theme["text"], 
-                fontproperties=font_prop, alpha=0.7) 
-            
-    ax.axhline(y=0.15, xmin=0.3, xmax=0.7, color=theme["edge"], linewidth=1, alpha=0.5)
-    return fig
+# --- 5. 任务进度 ---
+@st.fragment(run_every=1)
+def poll_job(job):
+    """每秒刷新一次进度，完成后重跑整个页面显示结果"""
+    status = get_job_queue().status(job)
+    if status is None or status["stage"] in ("done", "error"):
+        st.rerun()
+    st.info(STAGE_LABELS.get(status["stage"], "⏳ 处理中..."))
+
+def show_job(job, file_name):
+    status = get_job_queue().status(job)
+    if status is None:
+        return
+    if status["stage"] == "error":
+        st.error(f"出错: {status['error']}")
+    elif status["stage"] == "done":
+        st.image(status["path"])
+        with open(status["path"], "rb") as f:
+            st.download_button("📥 下载原图", data=f, file_name=file_name, mime="image/png")
+    else:
+        poll_job(job)
 
 # --- 6. 界面布局 ---
 col1, col2 = st.columns([1, 2])
@@ -160,17 +159,19 @@ with col2:
                 final_sub = poster_subtitle
             # ---------------------
 
-            with st.spinner(f"💾 正在下载数据..."):
-                try:
-                    G = get_map_data((lat, lon), radius, net_type)
-                    with st.spinner("🎨 正在渲染..."):
-                        fig = render_poster(G, selected_theme, final_title, final_sub)
-                        st.pyplot(fig)
-                        fn = f"poster_{city_input}.png"
-                        fig.savefig(fn, dpi=150, bbox_inches='tight', facecolor=THEMES[selected_theme]["bg"])
-                        with open(fn, "rb") as f:
-                            st.download_button("📥 下载原图", data=f, file_name=fn, mime="image/png")
-                except Exception as e:
-                    st.error(f"出错: {e}")
+            # 提交到后台队列；相同参数的任务只渲染一次
+            st.session_state.job_id = get_job_queue().submit({
+                "point": [lat, lon],
+                "radius": radius,
+                "network_type": net_type,
+                "theme": THEMES[selected_theme],
+                "title": final_title,
+                "subtitle": final_sub,
+                "font_path": zh_font_path,
+            })
+            st.session_state.job_file = f"poster_{city_input}.png"
         else:
             st.error("❌ 找不到城市")
+
+    if st.session_state.get("job_id"):
+        show_job(st.session_state.job_id, st.session_state.job_file)
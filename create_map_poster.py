@@ -1,67 +1,61 @@
-from matplotlib.figure import Figure
-from networkx import MultiDiGraph
-import osmnx as ox
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-import matplotlib.colors as mcolors
-import numpy as np
-from geopy.geocoders import Nominatim
-from tqdm import tqdm
+"""
+City Map Poster Generator.
+
+Heavy libraries (osmnx, geopandas, matplotlib, numpy, geopy, ...) are only
+imported inside the functions that need them, so listing themes, validating
+arguments or importing this module as a library stays fast and has no side
+effects on the filesystem.
+"""
+from __future__ import annotations
+
 import time
+_IMPORT_START = time.perf_counter()
+
 import json
 import os
 import sys
 from datetime import datetime
 import argparse
+import itertools
 import pickle
-import asyncio
-from pathlib import Path
-from hashlib import md5
-from typing import cast
-from geopandas import GeoDataFrame
-import pickle
-
-class CacheError(Exception):
-    """Raised when a cache operation fails."""
-    pass
-
-CACHE_DIR_PATH = os.environ.get("CACHE_DIR", "cache")
-CACHE_DIR = Path(CACHE_DIR_PATH)
+import shutil
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from hashlib import sha256
+from typing import TYPE_CHECKING
 
-CACHE_DIR.mkdir(exist_ok=True)
-
-def cache_file(key: str) -> str:
-    encoded = md5(key.encode()).hexdigest()
-    return f"{encoded}.pkl"
-
-def cache_get(name: str) -> dict | None:
-    path = CACHE_DIR / cache_file(name)
-    if path.exists():
-        with path.open("rb") as f:
-            return pickle.load(f)
-    return None
-
-def cache_set(name: str, obj) -> None:
-    path = CACHE_DIR / cache_file(name)
-    try:
-        with path.open("wb") as f:
-            pickle.dump(obj, f)
-    except pickle.PickleError as e:
-        raise CacheError(
-            f"Serialization error while saving cache for '{name}': {e}"
-        ) from e
-    except (OSError, IOError) as e:
-        raise CacheError(
-            f"File error while saving cache for '{name}': {e}"
-        ) from e
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+    from networkx import MultiDiGraph
 
 THEMES_DIR = "themes"
 FONTS_DIR = "fonts"
 POSTERS_DIR = "posters"
-
-CACHE_DIR = ".cache"
+OUTPUT_INDEX = os.path.join(POSTERS_DIR, "index.json")
+
+# Bump whenever a drawing change alters the output, so stored posters
+# rendered by an older version are no longer considered identical.
+RENDERER_VERSION = "1"
+
+OUTPUT_FORMATS = ['png', 'svg', 'pdf', 'webp', 'jpg']
+RASTER_FORMATS = ['png', 'webp', 'jpg']
+FORMAT_ALIASES = {'jpeg': 'jpg'}
+PIL_FORMATS = {'png': 'PNG', 'webp': 'WEBP', 'jpg': 'JPEG'}
+DEFAULT_DPI = 300
+POSTER_SIZE = (12, 16)  # inches
+THUMBNAIL_WIDTH = 400
+# zlib level for PNG output: 0 (fastest, largest) .. 9 (slowest, smallest)
+DEFAULT_PNG_COMPRESSION = 6
+# Quality for lossy WebP/JPEG output (1-100)
+DEFAULT_QUALITY = 90
+
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+# Published scene arrays that renderers memory-map instead of unpickling
+SCENE_ARRAYS_DIR = os.path.join(CACHE_DIR, "arrays")
 
 class CacheError(Exception):
+    """Raised when a cache operation fails."""
     pass
 
 
@@ -82,16 +76,143 @@ def cache_get(key: str):
 
 
 def cache_set(key: str, value):
+    """
+    Write a cache entry atomically: the pickle goes to a temporary file that
+    replaces the entry in one step, so readers never see a partial write.
+    """
+    tmp_path = None
     try:
-        if not os.path.exists(CACHE_DIR):
-            os.makedirs(CACHE_DIR)
+        os.makedirs(CACHE_DIR, exist_ok=True)
         path = _cache_path(key)
-        with open(path, "wb") as f:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
             pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
     except Exception as e:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise CacheError(f"Cache write failed: {e}")
 
 
+def cache_delete(key: str):
+    try:
+        path = _cache_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        raise CacheError(f"Cache delete failed: {e}")
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """
+    Hold an exclusive OS-level lock on lock_path for the duration of the
+    block. Works across processes and across threads of one process, since
+    every holder opens its own lock file handle.
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def cache_lock(key: str):
+    """
+    Lock a cache key (a .lock file next to the entry); see file_lock.
+    """
+    return file_lock(_cache_path(key)[:-len(".pkl")] + ".lock")
+
+
+def cache_get_or_fetch(key: str, fetch, refresh=False):
+    """
+    Single-flight cache lookup. Returns (value, cached): the cached value for
+    key, or the result of fetch(), which is then cached (None is not).
+
+    Only one process or thread fetches a missing key at a time; the others
+    wait on the key's lock and then read what it stored. With refresh the
+    entry is fetched again, unless another caller finished a fetch while
+    this one was waiting.
+    """
+    requested = time.time()
+    if not refresh:
+        value = cache_get(key)
+        if value is not None:
+            return value, True
+    with cache_lock(key):
+        mtime = cache_mtime(key)
+        if mtime is not None and (not refresh or mtime >= requested):
+            value = cache_get(key)
+            if value is not None:
+                return value, True
+        value = fetch()
+        if value is not None:
+            try:
+                cache_set(key, value)
+            except CacheError as e:
+                print(e)
+    return value, False
+
+
+STAGE_TIMINGS = {}
+
+
+@contextmanager
+def timed(stage):
+    """
+    Add the wall time spent in the block to STAGE_TIMINGS[stage].
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_TIMINGS[stage] = STAGE_TIMINGS.get(stage, 0.0) + time.perf_counter() - start
+
+
+def print_timings():
+    """Print the time spent in each stage, in the order they first ran."""
+    print("\nTimings:")
+    print("-" * 40)
+    for stage, seconds in STAGE_TIMINGS.items():
+        print(f"  {stage:<24}{seconds * 1000:>10.0f} ms")
+
+
+def cache_mtime(key: str):
+    """
+    Modification time of the cache entry, or None if it is missing.
+    """
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    return os.path.getmtime(path)
+
+
+def cache_age(key: str):
+    """
+    Seconds since the cache entry was written, or None if it is missing.
+    """
+    mtime = cache_mtime(key)
+    return None if mtime is None else time.time() - mtime
+
+
 def load_fonts():
     """
     Load Roboto fonts from the fonts directory.
@@ -111,21 +232,207 @@ def load_fonts():
     
     return fonts
 
-FONTS = load_fonts()
+_FONTS = None
+
+def get_fonts():
+    """
+    Fonts used on the poster, loaded on first use rather than at import.
+    """
+    global _FONTS
+    if _FONTS is None:
+        _FONTS = load_fonts() or {}
+    return _FONTS
 
-def generate_output_filename(city, theme_name, output_format):
+def generate_output_filename(city, theme_name, output_format, suffix=None, fingerprint=None, frame=None):
     """
-    Generate unique output filename with city, theme, and datetime.
+    Generate output filename with city, theme, and either the poster's input
+    fingerprint (stable across identical re-runs) or the current datetime.
+    An optional suffix tells apart several targets of the same format, and
+    a frame number orders the posters of a zoom series.
     """
     if not os.path.exists(POSTERS_DIR):
         os.makedirs(POSTERS_DIR)
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stamp = fingerprint[:12] if fingerprint else datetime.now().strftime("%Y%m%d_%H%M%S")
     city_slug = city.lower().replace(' ', '_')
+    if frame is not None:
+        theme_name = f"{theme_name}_{frame:03d}"
     ext = output_format.lower()
-    filename = f"{city_slug}_{theme_name}_{timestamp}.{ext}"
+    if suffix:
+        filename = f"{city_slug}_{theme_name}_{stamp}_{suffix}.{ext}"
+    else:
+        filename = f"{city_slug}_{theme_name}_{stamp}.{ext}"
     return os.path.join(POSTERS_DIR, filename)
 
+def get_data_version(point, dist, detail='full', layers=None):
+    """
+    Version of the map data for an area: when its projected scene was cached.
+    None if the scene is not cached yet.
+    """
+    key = find_scene_key(point, dist, detail, layers)
+    return None if key is None else int(cache_mtime(key))
+
+def _digest(value):
+    return sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+def poster_slot(city, country, dist, theme_name, target, country_label=None, frame=None):
+    """
+    Identify what a poster *is* (place, theme, size, format), regardless of
+    data, theme contents or renderer version. Newer renders of the same slot
+    supersede older ones. A zoom series frame is given as (number, radius of
+    the fetched area), so frames never share a slot with each other, with
+    other series or with standalone posters.
+    """
+    slot = {
+        'city': city.lower(), 'country': country.lower(), 'country_label': country_label,
+        'dist': dist, 'theme': theme_name,
+        'format': target['format'], 'size': output_target_suffix(target),
+    }
+    if frame is not None:
+        slot['frame'], slot['source_dist'] = frame
+    return _digest(slot)
+
+def poster_fingerprint(city, country, point, dist, theme_name, target, data_version, country_label=None, engine='matplotlib', detail='full', frame=None):
+    """
+    Fingerprint every input that affects a poster's bytes: data version and
+    detail level, theme file contents, distance, output target and renderer
+    version/engine, and for zoom series frames the slot's frame (see
+    poster_slot).
+    """
+    theme_file = os.path.join(THEMES_DIR, f"{theme_name}.json")
+    try:
+        with open(theme_file, 'rb') as f:
+            theme_hash = sha256(f.read()).hexdigest()
+    except OSError:
+        theme_hash = None
+    return _digest({
+        'slot': poster_slot(city, country, dist, theme_name, target, country_label, frame),
+        'point': list(point),
+        'data': data_version,
+        'detail': detail,
+        'theme': theme_hash,
+        'target': target,
+        'renderer': RENDERER_VERSION,
+        'engine': engine,
+    })
+
+def load_output_index():
+    """
+    Load the output store index mapping fingerprints to poster files.
+    """
+    if not os.path.exists(OUTPUT_INDEX):
+        return {}
+    try:
+        with open(OUTPUT_INDEX, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Ignoring unreadable output index {OUTPUT_INDEX}: {e}")
+        return {}
+
+def save_output_index(index):
+    """
+    Atomically write the output store index.
+    """
+    if not os.path.exists(POSTERS_DIR):
+        os.makedirs(POSTERS_DIR)
+    tmp_path = f"{OUTPUT_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, OUTPUT_INDEX)
+
+def output_index_lock():
+    """
+    Lock the output index, so concurrent runs re-read and merge it instead
+    of overwriting each other's entries.
+    """
+    return file_lock(f"{OUTPUT_INDEX}.lock")
+
+def lookup_output(index, fingerprint):
+    """
+    Return the stored poster path for a fingerprint if its file still exists.
+    """
+    entry = index.get(fingerprint)
+    if entry and os.path.exists(entry['path']):
+        return entry['path']
+    return None
+
+def collect_superseded_outputs(index):
+    """
+    Drop index entries whose file is gone, and delete stored posters that a
+    newer render of the same slot has superseded. Returns the removed paths.
+    """
+    # Forget missing files first, so a deleted newest poster doesn't take
+    # the older copies of its slot with it
+    for fingerprint, entry in list(index.items()):
+        if not os.path.exists(entry['path']):
+            del index[fingerprint]
+
+    newest = {}
+    for fingerprint, entry in index.items():
+        current = newest.get(entry['slot'])
+        if current is None or entry['created'] > index[current]['created']:
+            newest[entry['slot']] = fingerprint
+
+    removed = []
+    for fingerprint, entry in list(index.items()):
+        if newest[entry['slot']] != fingerprint:
+            os.remove(entry['path'])
+            removed.append(entry['path'])
+            del index[fingerprint]
+    return removed
+
+def parse_output_target(spec):
+    """
+    Parse an output target of the form FORMAT[:SIZE].
+
+    SIZE is optional and one of:
+      <n>dpi     render at the given DPI (raster default: 300)
+      <w>x<h>    fit inside a pixel box, keeping the poster aspect ratio
+      thumb[<w>] small preview, <w> pixels wide (default: 400)
+    """
+    fmt, _, size = spec.strip().lower().partition(':')
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}' (choose from {', '.join(OUTPUT_FORMATS)})")
+
+    target = {
+        'format': fmt, 'dpi': None, 'size': None, 'thumbnail': None,
+        'png_compression': DEFAULT_PNG_COMPRESSION, 'quality': DEFAULT_QUALITY,
+    }
+    try:
+        if not size:
+            pass
+        elif size.endswith('dpi'):
+            target['dpi'] = int(size[:-3])
+        elif size.startswith('thumb'):
+            target['thumbnail'] = int(size[5:] or THUMBNAIL_WIDTH)
+        elif 'x' in size:
+            width, height = size.split('x')
+            target['size'] = (int(width), int(height))
+        else:
+            raise ValueError
+        values = [target['dpi'], target['thumbnail'], *(target['size'] or ())]
+        if any(value is not None and value <= 0 for value in values):
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Invalid size '{size}' in output target '{spec}'") from None
+
+    if fmt not in RASTER_FORMATS and (target['size'] or target['thumbnail']):
+        raise ValueError(f"Pixel sizes only apply to raster formats, not '{fmt}'")
+    return target
+
+def output_target_suffix(target):
+    """
+    Short filename suffix describing a target's size ('' for the default).
+    """
+    if target['thumbnail']:
+        return "thumb"
+    if target['size']:
+        return f"{target['size'][0]}x{target['size'][1]}"
+    if target['dpi']:
+        return f"{target['dpi']}dpi"
+    return ""
+
 def get_available_themes():
     """
     Scans the themes directory and returns a list of available theme names.
@@ -141,9 +448,10 @@ def get_available_themes():
             themes.append(theme_name)
     return themes
 
-def load_theme(theme_name="feature_based"):
+def load_theme(theme_name="feature_based", quiet=False):
     """
-    Load theme from JSON file in themes directory.
+    Load theme from JSON file in themes directory. quiet skips the
+    "Loaded theme" message.
     """
     theme_file = os.path.join(THEMES_DIR, f"{theme_name}.json")
     
@@ -167,6 +475,8 @@ def load_theme(theme_name="feature_based"):
     
     with open(theme_file, 'r') as f:
         theme = json.load(f)
+        if quiet:
+            return theme
         print(f"✓ Loaded theme: {theme.get('name', theme_name)}")
         if 'description' in theme:
             print(f"  {theme['description']}")
@@ -175,10 +485,29 @@ def load_theme(theme_name="feature_based"):
 # Load theme (can be changed via command line or input)
 THEME = dict[str, str]()  # Will be loaded later
 
+# Road classes from least to most important: (theme key suffix, highway tags, line width).
+# Anything not listed falls into 'default'.
+ROAD_CLASSES = [
+    ('default', [], 0.4),
+    ('residential', ['residential', 'living_street', 'unclassified'], 0.4),
+    ('tertiary', ['tertiary', 'tertiary_link'], 0.6),
+    ('secondary', ['secondary', 'secondary_link'], 0.8),
+    ('primary', ['trunk', 'trunk_link', 'primary', 'primary_link'], 1.0),
+    ('motorway', ['motorway', 'motorway_link'], 1.2),
+]
+HIGHWAY_CLASS = {tag: code for code, (_, tags, _) in enumerate(ROAD_CLASSES) for tag in tags}
+
+ENGINES = ['matplotlib', 'numpy']
+# Per-channel difference (0-255) above which --verify-engine counts a pixel as different
+ENGINE_TOLERANCE = 32
+
 def create_gradient_fade(ax, color, location='bottom', zorder=10):
     """
     Creates a fade effect at the top or bottom of the map.
     """
+    import numpy as np
+    import matplotlib.colors as mcolors
+
     vals = np.linspace(0, 1, 256).reshape(-1, 1)
     gradient = np.hstack((vals, vals))
     
@@ -209,6 +538,17 @@ def create_gradient_fade(ax, color, location='bottom', zorder=10):
     ax.imshow(gradient, extent=[xlim[0], xlim[1], y_bottom, y_top], 
               aspect='auto', cmap=custom_cmap, zorder=zorder, origin='lower')
 
+def get_road_class(highway):
+    """
+    Map an OSM highway tag (string or list) to its index in ROAD_CLASSES.
+    """
+    # Handle list of highway types (take the first one); missing tags count as unclassified
+    if isinstance(highway, list):
+        highway = highway[0] if highway else 'unclassified'
+    if not isinstance(highway, str):
+        highway = 'unclassified'
+    return HIGHWAY_CLASS.get(highway, 0)
+
 def get_edge_colors_by_type(G):
     """
     Assigns colors to edges based on road type hierarchy.
@@ -217,28 +557,8 @@ def get_edge_colors_by_type(G):
     edge_colors = []
     
     for u, v, data in G.edges(data=True):
-        # Get the highway type (can be a list or string)
-        highway = data.get('highway', 'unclassified')
-        
-        # Handle list of highway types (take the first one)
-        if isinstance(highway, list):
-            highway = highway[0] if highway else 'unclassified'
-        
-        # Assign color based on road type
-        if highway in ['motorway', 'motorway_link']:
-            color = THEME['road_motorway']
-        elif highway in ['trunk', 'trunk_link', 'primary', 'primary_link']:
-            color = THEME['road_primary']
-        elif highway in ['secondary', 'secondary_link']:
-            color = THEME['road_secondary']
-        elif highway in ['tertiary', 'tertiary_link']:
-            color = THEME['road_tertiary']
-        elif highway in ['residential', 'living_street', 'unclassified']:
-            color = THEME['road_residential']
-        else:
-            color = THEME['road_default']
-        
-        edge_colors.append(color)
+        name = ROAD_CLASSES[get_road_class(data.get('highway', 'unclassified'))][0]
+        edge_colors.append(THEME[f'road_{name}'])
     
     return edge_colors
 
@@ -250,39 +570,30 @@ def get_edge_widths_by_type(G):
     edge_widths = []
     
     for u, v, data in G.edges(data=True):
-        highway = data.get('highway', 'unclassified')
-        
-        if isinstance(highway, list):
-            highway = highway[0] if highway else 'unclassified'
-        
-        # Assign width based on road importance
-        if highway in ['motorway', 'motorway_link']:
-            width = 1.2
-        elif highway in ['trunk', 'trunk_link', 'primary', 'primary_link']:
-            width = 1.0
-        elif highway in ['secondary', 'secondary_link']:
-            width = 0.8
-        elif highway in ['tertiary', 'tertiary_link']:
-            width = 0.6
-        else:
-            width = 0.4
-        
-        edge_widths.append(width)
+        edge_widths.append(ROAD_CLASSES[get_road_class(data.get('highway', 'unclassified'))][2])
     
     return edge_widths
 
-def get_coordinates(city, country):
+def get_coordinates(city, country, refresh=False):
     """
     Fetches coordinates for a given city and country using geopy.
     Includes rate limiting to be respectful to the geocoding service.
+    refresh looks the city up again even if it is cached.
     """
-    coords = f"coords_{city.lower()}_{country.lower()}"
-    cached = cache_get(coords)
+    coords, cached = cache_get_or_fetch(coords_cache_key(city, country), lambda: geocode(city, country), refresh=refresh)
     if cached:
         print(f"✓ Using cached coordinates for {city}, {country}")
-        return cached
+    return coords
 
+
+def geocode(city, country):
+    """
+    Look up a city's (lat, lon) with Nominatim.
+    """
     print("Looking up coordinates...")
+    import asyncio
+    from geopy.geocoders import Nominatim
+
     geolocator = Nominatim(user_agent="city_map_poster", timeout=10)
     
     # Add a small delay to respect Nominatim's usage policy
@@ -313,15 +624,19 @@ def get_coordinates(city, country):
         else:
             print("✓ Found location (address not available)")
         print(f"✓ Coordinates: {location.latitude}, {location.longitude}")
-        try:
-            cache_set(coords, (location.latitude, location.longitude))
-        except CacheError as e:
-            print(e)
         return (location.latitude, location.longitude)
     else:
         raise ValueError(f"Could not find coordinates for {city}, {country}")
     
-def get_crop_limits(G: MultiDiGraph, fig: Figure) -> tuple[tuple[float, float], tuple[float, float]]:
+def graph_extent(G: MultiDiGraph) -> tuple[float, float, float, float]:
+    """
+    Node extent (minx, maxx, miny, maxy) of a graph in its coordinates.
+    """
+    xs = [data['x'] for _, data in G.nodes(data=True)]
+    ys = [data['y'] for _, data in G.nodes(data=True)]
+    return min(xs), max(xs), min(ys), max(ys)
+
+def get_crop_limits(G: MultiDiGraph, fig: Figure, extent=None) -> tuple[tuple[float, float], tuple[float, float]]:
     """
     Determine cropping limits to maintain aspect ratio of the figure.
 
@@ -332,14 +647,13 @@ def get_crop_limits(G: MultiDiGraph, fig: Figure) -> tuple[tuple[float, float],
     :type G: MultiDiGraph
     :param fig: The matplotlib figure object
     :type fig: Figure
+    :param extent: Precomputed node extent (see graph_extent), used instead of G
+    :type extent: tuple[float, float, float, float] | None
     :return: Tuple of x and y limits for cropping
     :rtype: tuple[tuple[float, float], tuple[float, float]]
     """
     # Compute node extents in projected coordinates
-    xs = [data['x'] for _, data in G.nodes(data=True)]
-    ys = [data['y'] for _, data in G.nodes(data=True)]
-    minx, maxx = min(xs), max(xs)
-    miny, maxy = min(ys), max(ys)
+    minx, maxx, miny, maxy = extent or graph_extent(G)
     x_range = maxx - minx
     y_range = maxy - miny
 
@@ -373,166 +687,903 @@ def get_crop_limits(G: MultiDiGraph, fig: Figure) -> tuple[tuple[float, float],
     
     return crop_xlim, crop_ylim
 
-def fetch_graph(point, dist) -> MultiDiGraph | None:
+# Feature layers that can be drawn under the roads. All layers a render needs
+# are fetched with one combined Overpass query and split locally by tags.
+# A theme draws the layers it has a color for (or lists under "layers").
+# zorders stay below ROAD_ZORDER; the numpy engine draws line layers after
+# all polygon layers, so line layers also sit above every polygon layer.
+FEATURE_LAYERS = {
+    'water': {'tags': {'natural': ['water'], 'waterway': ['riverbank']}, 'geometry': 'polygon', 'zorder': 1},
+    'parks': {'tags': {'leisure': ['park'], 'landuse': ['grass']}, 'geometry': 'polygon', 'zorder': 2},
+    'buildings': {'tags': {'building': True}, 'geometry': 'polygon', 'zorder': 2.2},
+    'railways': {'tags': {'railway': ['rail']}, 'geometry': 'line', 'zorder': 2.5, 'width': 0.5},
+    'coastline': {'tags': {'natural': ['coastline']}, 'geometry': 'line', 'zorder': 2.5, 'width': 0.6},
+}
+# Roads are drawn over every feature layer, in both engines
+ROAD_ZORDER = 3
+DEFAULT_LAYERS = ['water', 'parks']
+GEOMETRY_TYPES = {'polygon': ['Polygon', 'MultiPolygon'], 'line': ['LineString', 'MultiLineString']}
+
+# Highway classes fetched and drawn at each detail level, most detailed first.
+# None fetches everything (network_type='all'), including footpaths, service
+# roads and tracks.
+_ARTERIAL_HIGHWAYS = [
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link',
+]
+DETAIL_LEVELS = {
+    'full': None,
+    'streets': _ARTERIAL_HIGHWAYS + ['residential', 'living_street', 'unclassified', 'road'],
+    'arterial': _ARTERIAL_HIGHWAYS,
+}
+# Coarsest ground resolution (meters per output pixel) at which a level is
+# still worth fetching; anything coarser falls through to the last level.
+DETAIL_THRESHOLDS = [('full', 4.0), ('streets', 30.0)]
+
+# Chunked fetching (--tiles): at most FETCH_WORKERS tiles download at once,
+# Overpass requests start at least OVERPASS_MIN_INTERVAL seconds apart, and
+# each tile is tried up to TILE_RETRIES times.
+FETCH_WORKERS = 2
+OVERPASS_MIN_INTERVAL = 1.0
+TILE_RETRIES = 3
+
+_overpass_lock = threading.Lock()
+_overpass_last_request = 0.0
+
+
+def coords_cache_key(city, country):
+    return f"coords_{city.lower()}_{country.lower()}"
+
+
+def graph_cache_key(point, dist, detail='full'):
     lat, lon = point
-    graph = f"graph_{lat}_{lon}_{dist}"
-    cached = cache_get(graph)
-    if cached is not None:
-        print("✓ Using cached street network")
-        return cast(MultiDiGraph, cached)
+    if detail == 'full':
+        return f"graph_{lat}_{lon}_{dist}"
+    return f"graph_{lat}_{lon}_{dist}_{detail}"
 
-    try:
-        G = ox.graph_from_point(point, dist=dist, dist_type='bbox', network_type='all')
-        # Rate limit between requests
-        time.sleep(0.5)
+
+def features_cache_key(point, dist, tags, name):
+    lat, lon = point
+    tag_str = "_".join(sorted(tags.keys()))
+    return f"{name}_{lat}_{lon}_{dist}_{tag_str}"
+
+
+def scene_cache_key(point, dist, detail='full', layers=None):
+    lat, lon = point
+    key = f"scene_{lat}_{lon}_{dist}"
+    if detail != 'full':
+        key += f"_{detail}"
+    layers = normalize_layers(layers or DEFAULT_LAYERS)
+    if layers != DEFAULT_LAYERS:
+        key += "_" + "+".join(layers)
+    return key
+
+
+def normalize_layers(layers):
+    """
+    Known layer names from layers, in FEATURE_LAYERS order without duplicates.
+    """
+    return [name for name in FEATURE_LAYERS if name in layers]
+
+
+def get_theme_layers(theme):
+    """
+    Feature layers a theme draws: the names in its "layers" list, or else
+    every layer it defines a color for. Layers without a color are skipped.
+    """
+    names = theme.get('layers') or [name for name in FEATURE_LAYERS if name in theme]
+    for name in names:
+        if name not in FEATURE_LAYERS:
+            print(f"⚠ Unknown layer '{name}' in theme (known: {', '.join(FEATURE_LAYERS)})")
+        elif name not in theme:
+            print(f"⚠ Theme has no color for layer '{name}', skipping it")
+    return [name for name in normalize_layers(names) if name in theme]
+
+
+def get_layer_sources(layers):
+    """
+    Layer sets whose cached data can serve a set of layers: the set itself
+    first, then ever larger supersets, which are split or filtered locally.
+    """
+    layers = normalize_layers(layers)
+    extra = [name for name in FEATURE_LAYERS if name not in layers]
+    return [normalize_layers(layers + list(more))
+            for size in range(len(extra) + 1)
+            for more in itertools.combinations(extra, size)]
+
+
+def combine_layer_tags(layers):
+    """
+    Union of the OSM tags of several layers, for a single Overpass query.
+    """
+    tags = {}
+    for name in layers:
+        for key, values in FEATURE_LAYERS[name]['tags'].items():
+            if values is True or tags.get(key) is True:
+                tags[key] = True
+            else:
+                tags[key] = sorted(set(tags.get(key, [])) | set(values))
+    return tags
+
+
+def split_layers(data, layers):
+    """
+    Split a combined feature GeoDataFrame into {layer name: GeoDataFrame}
+    by matching each layer's tags. Empty layers map to None.
+    """
+    result = {}
+    for name in layers:
+        if data is None or data.empty:
+            result[name] = None
+            continue
+        mask = None
+        for key, values in FEATURE_LAYERS[name]['tags'].items():
+            if key not in data.columns:
+                continue
+            match = data[key].notna() if values is True else data[key].isin(values)
+            mask = match if mask is None else mask | match
+        result[name] = data[mask] if mask is not None and mask.any() else None
+    return result
+
+
+def get_auto_detail(dist, dpi):
+    """
+    Pick the detail level for a map radius and output DPI: roads that would
+    end up a fraction of a pixel apart on the poster are not worth fetching.
+    """
+    meters_per_pixel = 2 * dist / (POSTER_SIZE[1] * dpi)
+    for level, max_meters_per_pixel in DETAIL_THRESHOLDS:
+        if meters_per_pixel <= max_meters_per_pixel:
+            return level
+    return list(DETAIL_LEVELS)[-1]
+
+
+def resolve_detail(requested, theme, dist, dpi):
+    """
+    Detail level for a render: an explicit --detail wins, then the theme's
+    "detail" key, then the automatic policy.
+    """
+    level = requested if requested and requested != 'auto' else theme.get('detail', 'auto')
+    if level == 'auto':
+        return get_auto_detail(dist, dpi)
+    if level not in DETAIL_LEVELS:
+        print(f"⚠ Unknown detail level '{level}', choosing automatically")
+        return get_auto_detail(dist, dpi)
+    return level
+
+
+def get_detail_filter(detail):
+    """
+    osmnx custom_filter for a detail level, or None to fetch everything.
+    """
+    highways = DETAIL_LEVELS[detail]
+    if highways is None:
+        return None
+    return f'["highway"~"^({"|".join(highways)})$"]["area"!~"yes"]'
+
+
+def get_graph_sources(point, dist, detail):
+    """
+    Cache keys that can serve a graph at this detail level: its own entry
+    first, then ever more detailed ones.
+    """
+    levels = list(DETAIL_LEVELS)
+    return [(level, graph_cache_key(point, dist, level))
+            for level in reversed(levels[:levels.index(detail) + 1])]
+
+
+def filter_graph_detail(G, detail):
+    """
+    Reduce a more detailed graph to the highway classes of a detail level,
+    in place. Edges merged from several ways are kept if any way qualifies.
+    """
+    allowed = DETAIL_LEVELS[detail]
+    if allowed is None:
+        return G
+    allowed = set(allowed)
+    drop = []
+    for u, v, k, highway in G.edges(keys=True, data='highway'):
+        highways = set(highway) if isinstance(highway, list) else {highway}
+        if not highways & allowed:
+            drop.append((u, v, k))
+    G.remove_edges_from(drop)
+    G.remove_nodes_from([node for node, degree in G.degree() if degree == 0])
+    return G
+
+
+def _wait_for_overpass_slot():
+    """
+    Block until the next Overpass request may start under the rate limit.
+    """
+    global _overpass_last_request
+    with _overpass_lock:
+        delay = _overpass_last_request + OVERPASS_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _overpass_last_request = time.monotonic()
+
+
+def split_bbox(point, dist, tiles):
+    """
+    Split the bbox of radius dist around point into tiles x tiles
+    (left, bottom, right, top) sub-boxes.
+    """
+    import osmnx as ox
+
+    left, bottom, right, top = ox.utils_geo.bbox_from_point(point, dist)
+    xs = [left + (right - left) * i / tiles for i in range(tiles + 1)]
+    ys = [bottom + (top - bottom) * j / tiles for j in range(tiles + 1)]
+    return [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for j in range(tiles) for i in range(tiles)]
+
+
+def fetch_tiles(tiles, download, name, refresh=False):
+    """
+    Fetch (key, bbox) tiles with limited parallelism under the Overpass rate
+    limit and return their results in order.
+
+    Each tile is cached on its own as soon as it arrives and retried on its
+    own, so when a tile finally fails, a re-run only downloads the tiles
+    that are still missing. download(bbox) returns None for empty tiles.
+    """
+    def fetch_one(number, key, bbox):
+        def attempt_download():
+            for attempt in range(1, TILE_RETRIES + 1):
+                _wait_for_overpass_slot()
+                try:
+                    return download(bbox)
+                except Exception as e:
+                    if attempt == TILE_RETRIES:
+                        raise RuntimeError(f"{name} tile {number}/{len(tiles)} failed: {e}") from e
+                    print(f"⚠ {name} tile {number}/{len(tiles)} failed ({e}), retrying...")
+                    time.sleep(2 ** attempt)
+
+        data, _ = cache_get_or_fetch(key, attempt_download, refresh=refresh)
+        return data
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        futures = [pool.submit(fetch_one, number, key, bbox)
+                   for number, (key, bbox) in enumerate(tiles, 1)]
+        return [future.result() for future in futures]
+
+
+def fetch_graph_tiled(point, dist, tiles, refresh=False, detail='full'):
+    """
+    Fetch the street network as tiles x tiles sub-area queries and stitch
+    them into one graph.
+
+    Tiles are downloaded unsimplified and keep the edges crossing their
+    border, so after composing them (OSM node ids make seam nodes and edges
+    coincide) the merged graph is simplified once and truncated to the full
+    bbox, exactly like a single query.
+    """
+    import networkx as nx
+    import osmnx as ox
+    from osmnx._errors import InsufficientResponseError
+
+    def download(bbox):
+        try:
+            return ox.graph_from_bbox(bbox, network_type='all', simplify=False,
+                                      retain_all=True, truncate_by_edge=True,
+                                      custom_filter=get_detail_filter(detail))
+        except InsufficientResponseError:
+            return None
+
+    base_key = graph_cache_key(point, dist, detail)
+    tile_keys = [f"{base_key}_tile{tiles}_{i}" for i in range(tiles * tiles)]
+    parts = fetch_tiles(list(zip(tile_keys, split_bbox(point, dist, tiles))), download, "street network", refresh)
+    graphs = [part for part in parts if part is not None]
+    if not graphs:
+        raise ValueError("no street network found in any tile")
+
+    # Edges kept across the outer tile borders reach past the area; cut them
+    # back like graph_from_point does after simplifying
+    G = ox.simplify_graph(nx.compose_all(graphs))
+    G = ox.truncate.truncate_graph_bbox(G, ox.utils_geo.bbox_from_point(point, dist))
+    G = ox.truncate.largest_component(G)
+    for key in tile_keys:
+        cache_delete(key)
+    return G
+
+
+def fetch_features_tiled(point, dist, tags, name, tiles, refresh=False):
+    """
+    Fetch features as tiles x tiles sub-area queries and concatenate them,
+    dropping features that appear in more than one tile.
+    """
+    import osmnx as ox
+    import pandas as pd
+    from osmnx._errors import InsufficientResponseError
+
+    def download(bbox):
         try:
-            cache_set(graph, G)
-        except CacheError as e:
-            print(e)
+            return ox.features_from_bbox(bbox, tags=tags)
+        except InsufficientResponseError:
+            return None
+
+    base_key = features_cache_key(point, dist, tags, name)
+    tile_keys = [f"{base_key}_tile{tiles}_{i}" for i in range(tiles * tiles)]
+    parts = fetch_tiles(list(zip(tile_keys, split_bbox(point, dist, tiles))), download, name, refresh)
+    frames = [part for part in parts if part is not None and not part.empty]
+    if not frames:
+        raise ValueError(f"no {name} found in any tile")
+
+    data = pd.concat(frames)
+    data = data[~data.index.duplicated(keep='first')]
+    for key in tile_keys:
+        cache_delete(key)
+    return data
+
+
+def fetch_graph(point, dist, refresh=False, tiles=1, detail='full') -> MultiDiGraph | None:
+    graph_key = graph_cache_key(point, dist, detail)
+    if not refresh:
+        # A lower-detail request can be served from a more detailed entry
+        for level, key in get_graph_sources(point, dist, detail):
+            cached = cache_get(key)
+            if cached is None:
+                continue
+            if level == detail:
+                print("✓ Using cached street network")
+                return cached
+            print(f"✓ Using cached street network ({level} detail, reduced to {detail})")
+            return filter_graph_detail(cached, detail)
+
+    def download():
+        import osmnx as ox
+        if tiles > 1:
+            G = fetch_graph_tiled(point, dist, tiles, refresh=refresh, detail=detail)
+        else:
+            G = ox.graph_from_point(point, dist=dist, dist_type='bbox', network_type='all',
+                                    custom_filter=get_detail_filter(detail))
+        time.sleep(0.5)
+        return G
+
+    try:
+        # Concurrent renders of the same area share one download
+        G, cached = cache_get_or_fetch(graph_key, download, refresh=refresh)
+        if cached:
+            print("✓ Using cached street network")
         return G
     except Exception as e:
         print(f"OSMnx error while fetching graph: {e}")
         return None
 
-def fetch_features(point, dist, tags, name) -> GeoDataFrame | None:
-    lat, lon = point
-    tag_str = "_".join(tags.keys())
-    features = f"{name}_{lat}_{lon}_{dist}_{tag_str}"
-    cached = cache_get(features)
-    if cached is not None:
-        print(f"✓ Using cached {name}")
-        return cast(GeoDataFrame, cached)
 
-    try:
-        data = ox.features_from_point(point, tags=tags, dist=dist)
-        # Rate limit between requests
+def fetch_features(point, dist, tags, name, refresh=False, tiles=1):
+    def download():
+        import osmnx as ox
+        if tiles > 1:
+            data = fetch_features_tiled(point, dist, tags, name, tiles, refresh=refresh)
+        else:
+            data = ox.features_from_point(point, tags=tags, dist=dist)
         time.sleep(0.3)
-        try:
-            cache_set(features, data)
-        except CacheError as e:
-            print(e)
+        return data
+
+    try:
+        data, cached = cache_get_or_fetch(features_cache_key(point, dist, tags, name), download, refresh=refresh)
+        if cached:
+            print(f"✓ Using cached {name}")
         return data
     except Exception as e:
         print(f"OSMnx error while fetching features: {e}")
         return None
 
 
-def fetch_graph(point, dist):
-    lat, lon = point
-    graph_key = f"graph_{lat}_{lon}_{dist}"
-    cached = cache_get(graph_key)
-    if cached is not None:
-        print("✓ Using cached street network")
-        return cached
+def fetch_layers(point, dist, layers, refresh=False, tiles=1):
+    """
+    Fetch several feature layers with one combined Overpass query, cached as
+    a single artifact, and split the result into {layer name: GeoDataFrame}.
+    """
+    layers = normalize_layers(layers)
+    if not layers:
+        return {}
+    if not refresh and cache_mtime(features_cache_key(point, dist, combine_layer_tags(layers), "+".join(layers))) is None:
+        # A cached download of more layers (e.g. from a prefetch) covers these
+        for source in get_layer_sources(layers)[1:]:
+            data = cache_get(features_cache_key(point, dist, combine_layer_tags(source), "+".join(source)))
+            if data is not None:
+                print(f"✓ Using cached {'+'.join(source)} for {', '.join(layers)}")
+                return split_layers(data, layers)
+    data = fetch_features(point, dist, tags=combine_layer_tags(layers), name="+".join(layers),
+                          refresh=refresh, tiles=tiles)
+    return split_layers(data, layers)
+
+
+def project_layer(gdf, crs, geometry='polygon'):
+    """
+    Keep only the layer's geometry type (e.g. point features would show up
+    as dots on a polygon layer) and project it into the given CRS. Returns
+    None if nothing is left.
+    """
+    import osmnx as ox
 
+    if gdf is None or gdf.empty:
+        return None
+    shapes = gdf[gdf.geometry.type.isin(GEOMETRY_TYPES[geometry])]
+    if shapes.empty:
+        return None
     try:
-        G = ox.graph_from_point(point, dist=dist, dist_type='bbox', network_type='all')
-        time.sleep(0.5)
-        try:
-            cache_set(graph_key, G)
-        except CacheError as e:
-            print(e)
-        return G
-    except Exception as e:
-        print(f"OSMnx error while fetching graph: {e}")
+        return ox.projection.project_gdf(shapes, to_crs=crs)
+    except Exception:
+        return shapes.to_crs(crs)
+
+
+def _consecutive_segments(geometries):
+    """
+    Split linestrings/rings into an (N, 4) array of x0, y0, x1, y1 segments,
+    plus the index of the geometry each segment came from.
+    """
+    import numpy as np
+    import shapely
+
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    same = index[1:] == index[:-1]
+    return np.hstack([coords[:-1][same], coords[1:][same]]), index[:-1][same]
+
+def graph_segments(G):
+    """
+    Road segments of a projected graph with their ROAD_CLASSES codes.
+    """
+    import numpy as np
+    import osmnx as ox
+
+    edges = ox.graph_to_gdfs(G, nodes=False, fill_edge_geometry=True)
+    segments, index = _consecutive_segments(edges.geometry.values)
+    highways = edges['highway'] if 'highway' in edges else ['unclassified'] * len(edges)
+    classes = np.fromiter((get_road_class(h) for h in highways), dtype=np.uint8, count=len(edges))
+    return segments, classes[index]
+
+def polygon_edges(gdf):
+    """
+    Ring edges of projected polygons, exteriors counter-clockwise and holes
+    clockwise so they fill correctly under the nonzero winding rule.
+    """
+    import numpy as np
+    import shapely
+
+    if gdf is None:
+        return np.empty((0, 4))
+    polygons = shapely.orient_polygons(shapely.get_parts(gdf.geometry.values))
+    segments, _ = _consecutive_segments(shapely.get_rings(polygons))
+    return segments
+
+def line_segments(gdf):
+    """
+    Segments of projected (multi)linestrings.
+    """
+    import numpy as np
+    import shapely
+
+    if gdf is None:
+        return np.empty((0, 4))
+    segments, _ = _consecutive_segments(shapely.get_parts(gdf.geometry.values))
+    return segments
+
+def build_scene_arrays(scene):
+    """
+    Flatten a projected scene into the coordinate arrays the NumPy raster
+    engine draws from: polygon ring edges or line segments per feature layer.
+    """
+    roads, road_class = graph_segments(scene['graph'])
+    layers = {}
+    for name, gdf in scene['layers'].items():
+        if FEATURE_LAYERS[name]['geometry'] == 'polygon':
+            layers[name] = polygon_edges(gdf)
+        else:
+            layers[name] = line_segments(gdf)
+    return {'roads': roads, 'road_class': road_class, 'layers': layers}
+
+def get_scene_arrays(scene):
+    """
+    Coordinate arrays for a scene, building them for scenes cached before
+    they were stored alongside the graph.
+    """
+    if 'arrays' not in scene:
+        scene['arrays'] = build_scene_arrays(scene)
+    return scene['arrays']
+
+def build_scene(point, dist, G, features, detail='full'):
+    """
+    Project the street network and feature layers into one metric CRS so
+    distances and aspect are linear (meters), and cache the result.
+
+    The projected scene is what the renderer actually draws; caching it saves
+    reprojecting a large graph on every poster for the same area.
+    """
+    import osmnx as ox
+
+    G_proj = ox.project_graph(G)
+    crs = G_proj.graph['crs']
+    scene = {
+        'graph': G_proj,
+        'layers': {name: project_layer(gdf, crs, FEATURE_LAYERS[name]['geometry'])
+                   for name, gdf in features.items()},
+    }
+    scene['arrays'] = build_scene_arrays(scene)
+    key = scene_cache_key(point, dist, detail, list(features))
+    try:
+        cache_set(key, scene)
+        with cache_lock(f"{key}_arrays"):
+            publish_scene_arrays(key, scene, cache_mtime(key))
+    except (CacheError, OSError) as e:
+        print(e)
+    return scene
+
+
+def find_scene_key(point, dist, detail='full', layers=None):
+    """
+    Cache key of the scene that serves these layers: their own entry, or
+    else the smallest cached scene with a superset of them. None if there
+    is no such scene.
+    """
+    for source in get_layer_sources(layers or DEFAULT_LAYERS):
+        key = scene_cache_key(point, dist, detail, source)
+        if cache_mtime(key) is not None:
+            return key
+    return None
+
+
+def _read_scene(key):
+    scene = cache_get(key)
+    if scene is not None and 'layers' not in scene:
+        # Scenes cached before feature layers were generalized
+        scene = {'graph': scene['graph'], 'layers': {'water': scene.get('water'), 'parks': scene.get('parks')}}
+    return scene
+
+
+def load_scene(point, dist, detail='full', layers=None):
+    """
+    Return the cached projected scene for this area, detail level and set
+    of feature layers, or None. A scene cached with more layers is reduced
+    to the requested ones.
+    """
+    key = find_scene_key(point, dist, detail, layers)
+    scene = None if key is None else _read_scene(key)
+    if scene is None:
         return None
+    print("✓ Using cached projected scene")
+    names = normalize_layers(layers or DEFAULT_LAYERS)
+    if list(scene['layers']) != names:
+        reduced = {'graph': scene['graph'], 'layers': {name: scene['layers'].get(name) for name in names}}
+        if 'arrays' in scene:
+            arrays = scene['arrays']
+            reduced['arrays'] = dict(arrays, layers={name: arrays['layers'][name] for name in names if name in arrays['layers']})
+        scene = reduced
+    return scene
 
 
-def fetch_features(point, dist, tags, name):
-    lat, lon = point
-    tag_str = "_".join(sorted(tags.keys()))
-    features_key = f"{name}_{lat}_{lon}_{dist}_{tag_str}"
-    cached = cache_get(features_key)
-    if cached is not None:
-        print(f"✓ Using cached {name}")
-        return cached
+def _scene_arrays_dir(key):
+    return os.path.join(SCENE_ARRAYS_DIR, key.replace(os.sep, "_"))
+
+
+def publish_scene_arrays(key, scene, version):
+    """
+    Write a scene's coordinate arrays as .npy files that renderers can
+    memory-map (see attach_scene), tagged with the scene's cache version.
+    Roads are sorted by class so each class is a contiguous, zero-copy slice.
+    The directory is built aside and moved into place in one step.
+    """
+    import numpy as np
 
+    arrays = get_scene_arrays(scene)
+    order = np.argsort(arrays['road_class'], kind='stable')
+    road_class = arrays['road_class'][order]
+    offsets = np.searchsorted(road_class, np.arange(len(ROAD_CLASSES) + 1)).tolist()
+
+    path = _scene_arrays_dir(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_path)
     try:
-        data = ox.features_from_point(point, tags=tags, dist=dist)
-        time.sleep(0.3)
-        try:
-            cache_set(features_key, data)
-        except CacheError as e:
-            print(e)
-        return data
-    except Exception as e:
-        print(f"OSMnx error while fetching features: {e}")
+        np.save(os.path.join(tmp_path, "roads.npy"), arrays['roads'][order])
+        for name, coords in arrays['layers'].items():
+            np.save(os.path.join(tmp_path, f"layer_{name}.npy"), coords)
+        meta = {
+            'version': version,
+            'extent': graph_extent(scene['graph']),
+            'road_offsets': offsets,
+            'layers': list(arrays['layers']),
+        }
+        with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            # Processes still mapping the old files keep their view of them
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _attach_scene_arrays(key, version):
+    import numpy as np
+
+    path = _scene_arrays_dir(key)
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta['version'] != version:
+            return None
+        roads = np.load(os.path.join(path, "roads.npy"), mmap_mode='r')
+        layers = {name: np.load(os.path.join(path, f"layer_{name}.npy"), mmap_mode='r')
+                  for name in meta['layers']}
+    except (OSError, ValueError, KeyError):
         return None
+    return {
+        'graph': None,
+        'layers': {},
+        'extent': tuple(meta['extent']),
+        'arrays': {'roads': roads, 'road_offsets': meta['road_offsets'], 'layers': layers},
+    }
 
 
-def create_poster(city, country, point, dist, output_file, output_format, country_label=None, name_label=None):
-    print(f"\nGenerating map for {city}, {country}...")
-    
+def attach_scene(point, dist, detail='full', layers=None):
+    """
+    Map a cached scene's coordinate arrays read-only for the numpy engine,
+    publishing them first if needed. Every process rendering the area shares
+    one copy through the page cache instead of unpickling and holding the
+    whole scene. The result has no graph or feature frames, so it can only
+    be drawn with engine='numpy'. None if the scene is not cached.
+    """
+    key = find_scene_key(point, dist, detail, layers)
+    if key is None:
+        return None
+    version = cache_mtime(key)
+    scene = _attach_scene_arrays(key, version)
+    if scene is None:
+        # One process publishes; others wait and attach to its files
+        with cache_lock(f"{key}_arrays"):
+            scene = _attach_scene_arrays(key, version)
+            if scene is None:
+                # Publish every layer of the entry, not just the ones asked for
+                full = _read_scene(key)
+                if full is None:
+                    return None
+                try:
+                    publish_scene_arrays(key, full, version)
+                except OSError as e:
+                    print(f"⚠ Could not publish scene arrays ({e}), using the cached scene")
+                    return full
+                scene = _attach_scene_arrays(key, version)
+    if scene is not None:
+        print("✓ Attached shared scene arrays")
+    return scene
+
+
+def fetch_scene(point, dist, refresh=None, tiles=1, detail='full', layers=None):
+    """
+    Download (or load from cache) the street network and feature layers for
+    an area and build its projected scene. refresh re-downloads the listed
+    parts ('graph', 'features') even if they are cached; tiles > 1 splits
+    each download into tiles x tiles sub-area queries; detail limits the
+    road classes fetched (see DETAIL_LEVELS). All feature layers come from
+    one combined query.
+    """
+    from tqdm import tqdm
+
+    refresh = refresh or ()
+    layers = normalize_layers(layers or DEFAULT_LAYERS)
+
     # Progress bar for data fetching
-    with tqdm(total=3, desc="Fetching map data", unit="step", bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}') as pbar:
+    with tqdm(total=2, desc="Fetching map data", unit="step", bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}') as pbar:
         # 1. Fetch Street Network
         pbar.set_description("Downloading street network")
-        G = fetch_graph(point, dist)
+        G = fetch_graph(point, dist, refresh='graph' in refresh, tiles=tiles, detail=detail)
         if G is None:
             raise RuntimeError("Failed to retrieve street network data.")
         pbar.update(1)
         
-        # 2. Fetch Water Features
-        pbar.set_description("Downloading water features")
-        water = fetch_features(point, dist, tags={'natural': 'water', 'waterway': 'riverbank'}, name='water')
-        pbar.update(1)
-        
-        # 3. Fetch Parks
-        pbar.set_description("Downloading parks/green spaces")
-        parks = fetch_features(point, dist, tags={'leisure': 'park', 'landuse': 'grass'}, name='parks')
+        # 2. Fetch all feature layers in one query
+        pbar.set_description(f"Downloading {', '.join(layers)}")
+        features = fetch_layers(point, dist, layers, refresh='features' in refresh, tiles=tiles)
         pbar.update(1)
     
     print("✓ All data retrieved successfully!")
-    
+    return build_scene(point, dist, G, features, detail=detail)
+
+
+def get_target_pixel_size(target, fig_width, fig_height):
+    """
+    Pixel dimensions of a raster target for a figure of the given size in inches.
+    """
+    if target['thumbnail']:
+        scale = target['thumbnail'] / fig_width
+    elif target['size']:
+        box_width, box_height = target['size']
+        scale = min(box_width / fig_width, box_height / fig_height)
+    else:
+        scale = target['dpi'] or DEFAULT_DPI
+    return round(fig_width * scale), round(fig_height * scale)
+
+def render_raster_buffer(fig, dpi):
+    """
+    Draw the figure once with Agg at the given DPI and return its RGBA pixels.
+    """
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig.set_dpi(dpi)
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+def encode_raster(pixels, path, target, size, dpi):
+    """
+    Encode an RGBA buffer to a raster target, resizing it first if needed.
+
+    Runs without touching matplotlib, so it can be handed to a thread or
+    process pool while the next poster is being drawn. Returns the path.
+    """
+    from PIL import Image
+
+    image = Image.fromarray(pixels, 'RGBA')
+    if image.size != size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    fmt = target['format']
+    save_kwargs = dict(format=PIL_FORMATS[fmt], dpi=(dpi, dpi))
+    if fmt == 'png':
+        save_kwargs['compress_level'] = target['png_compression']
+    elif fmt == 'webp':
+        save_kwargs['quality'] = target['quality']
+    elif fmt == 'jpg':
+        # JPEG has no alpha channel; the poster background is opaque anyway
+        image = image.convert('RGB')
+        save_kwargs['quality'] = target['quality']
+
+    image.save(path, **save_kwargs)
+    return path
+
+def save_outputs(fig, outputs, encoder=None):
+    """
+    Write every (target, path) pair in outputs from one drawn figure.
+
+    Vector targets are saved straight from the figure. Raster targets share a
+    single RGBA buffer rendered at the largest resolution any of them needs,
+    and smaller sizes are downscaled from it instead of being redrawn. All
+    saves use the fixed figure layout, so no tight-bbox redraw is needed.
+
+    If an encoder executor is given, raster encoding is submitted to it and
+    the list of futures is returned; otherwise it runs inline and the list
+    of written paths is returned.
+    """
+    fig_width, fig_height = fig.get_size_inches()
+    raster = [(t, p) for t, p in outputs if t['format'] in RASTER_FORMATS]
+    vector = [(t, p) for t, p in outputs if t['format'] not in RASTER_FORMATS]
+    results = []
+
+    for target, path in vector:
+        print(f"Saving to {path}...")
+        # An explicit :<n>dpi sets the resolution of any images embedded in the vector file
+        dpi = {'dpi': target['dpi']} if target['dpi'] else {}
+        fig.savefig(path, format=target['format'], facecolor=THEME['bg'], **dpi)
+        results.append(path)
+
+    if not raster:
+        return results
+
+    sizes = [get_target_pixel_size(t, fig_width, fig_height) for t, _ in raster]
+    buffer_dpi = max(width for width, _ in sizes) / fig_width
+    pixels = render_raster_buffer(fig, buffer_dpi)
+
+    for (target, path), size in zip(raster, sizes):
+        print(f"Saving to {path}...")
+        dpi = round(size[0] / fig_width)
+        if encoder is None:
+            results.append(encode_raster(pixels, path, target, size, dpi))
+        else:
+            results.append(encoder.submit(encode_raster, pixels, path, target, size, dpi))
+    return results
+
+def get_render_dpi(outputs):
+    """
+    Highest DPI any target in outputs needs: raster targets at their pixel
+    size, vector targets at their :<n>dpi or DEFAULT_DPI (so a thumbnail
+    never sets the resolution of a print PDF).
+    """
+    fig_width, fig_height = POSTER_SIZE
+    dpis = [get_target_pixel_size(t, fig_width, fig_height)[0] / fig_width
+            if t['format'] in RASTER_FORMATS else t['dpi'] or DEFAULT_DPI
+            for t, _ in outputs]
+    return max(dpis) if dpis else DEFAULT_DPI
+
+def draw_layers_numpy(ax, scene, xlim, ylim, dpi):
+    """
+    Rasterize feature layers and roads with the NumPy engine at the given DPI
+    and place the image in the axes, covering exactly the crop window.
+    """
+    import raster_engine
+
+    fig_width, fig_height = ax.figure.get_size_inches()
+    width, height = round(fig_width * dpi), round(fig_height * dpi)
+    arrays = get_scene_arrays(scene)
+
+    polygon_layers = []
+    line_layers = []
+    for name in sorted(get_theme_layers(THEME), key=lambda name: FEATURE_LAYERS[name]['zorder']):
+        layer = FEATURE_LAYERS[name]
+        coords = arrays['layers'].get(name)
+        if coords is None:
+            continue
+        if layer['geometry'] == 'polygon':
+            polygon_layers.append((coords, THEME[name]))
+        else:
+            line_layers.append((coords, THEME[name], layer['width'] * dpi / 72))
+    for code, (name, _, line_width) in enumerate(ROAD_CLASSES):
+        if 'road_offsets' in arrays:
+            # Published arrays are sorted by class: slice without copying
+            start, stop = arrays['road_offsets'][code:code + 2]
+            segments = arrays['roads'][start:stop]
+        else:
+            segments = arrays['roads'][arrays['road_class'] == code]
+        line_layers.append((segments, THEME[f'road_{name}'], line_width * dpi / 72))
+
+    print("Rasterizing map layers...")
+    pixels = raster_engine.render_layers(width, height, xlim, ylim, THEME['bg'], polygon_layers, line_layers)
+    # 'none' embeds the buffer as-is in vector outputs (PDF/SVG) instead of
+    # resampling it to the figure DPI; raster saves at dpi map it 1:1
+    ax.imshow(pixels, extent=[xlim[0], xlim[1], ylim[0], ylim[1]], origin='upper',
+              interpolation='none', aspect='auto', zorder=1)
+
+def draw_poster(city, country, point, scene, engine='matplotlib', dpi=DEFAULT_DPI, country_label=None, window=None):
+    """
+    Draw a poster for a projected scene and return the figure.
+
+    With engine='numpy' the map layers are rasterized at dpi, so the figure
+    should be saved at that DPI (vector outputs embed the raster map).
+    window is the (xlim, ylim) map area to show; by default the extent of
+    the street network, cropped to the poster aspect.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.font_manager import FontProperties
+
+    G_proj = scene['graph']
+    FONTS = get_fonts()
+
     # 2. Setup Plot
     print("Rendering map...")
-    fig, ax = plt.subplots(figsize=(12, 16), facecolor=THEME['bg'])
+    fig, ax = plt.subplots(figsize=POSTER_SIZE, facecolor=THEME['bg'])
     ax.set_facecolor(THEME['bg'])
     ax.set_position((0.0, 0.0, 1.0, 1.0))
 
-    # Project graph to a metric CRS so distances and aspect are linear (meters)
-    G_proj = ox.project_graph(G)
-    
-    # 3. Plot Layers
-    # Layer 1: Polygons (filter to only plot polygon/multipolygon geometries, not points)
-    if water is not None and not water.empty:
-        # Filter to only polygon/multipolygon geometries to avoid point features showing as dots
-        water_polys = water[water.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-        if not water_polys.empty:
-            # Project water features in the same CRS as the graph
-            try:
-                water_polys = ox.projection.project_gdf(water_polys)
-            except Exception:
-                water_polys = water_polys.to_crs(G_proj.graph['crs'])
-            water_polys.plot(ax=ax, facecolor=THEME['water'], edgecolor='none', zorder=1)
-    
-    if parks is not None and not parks.empty:
-        # Filter to only polygon/multipolygon geometries to avoid point features showing as dots
-        parks_polys = parks[parks.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-        if not parks_polys.empty:
-            # Project park features in the same CRS as the graph
-            try:
-                parks_polys = ox.projection.project_gdf(parks_polys)
-            except Exception:
-                parks_polys = parks_polys.to_crs(G_proj.graph['crs'])
-            parks_polys.plot(ax=ax, facecolor=THEME['parks'], edgecolor='none', zorder=2)
-    
-    # Layer 2: Roads with hierarchy coloring
-    print("Applying road hierarchy colors...")
-    edge_colors = get_edge_colors_by_type(G_proj)
-    edge_widths = get_edge_widths_by_type(G_proj)
-
     # Determine cropping limits to maintain the poster aspect ratio
-    crop_xlim, crop_ylim = get_crop_limits(G_proj, fig)
-
-    # Plot the projected graph and then apply the cropped limits
-    ox.plot_graph(
-        G_proj, ax=ax, bgcolor=THEME['bg'],
-        node_size=0,
-        edge_color=edge_colors,
-        edge_linewidth=edge_widths,
-        show=False, close=False
-    )
+    crop_xlim, crop_ylim = window or get_crop_limits(G_proj, fig, extent=scene.get('extent'))
+
+    # 3. Plot Layers
+    if engine == 'numpy':
+        # Feature layers and roads rasterized in one image; matplotlib only
+        # composites the gradients and text on top
+        draw_layers_numpy(ax, scene, crop_xlim, crop_ylim, dpi)
+    else:
+        # Layer 1: Features (already filtered to the layer's geometry type and projected)
+        for name in get_theme_layers(THEME):
+            gdf = scene['layers'].get(name)
+            if gdf is None:
+                continue
+            layer = FEATURE_LAYERS[name]
+            if layer['geometry'] == 'polygon':
+                gdf.plot(ax=ax, facecolor=THEME[name], edgecolor='none', zorder=layer['zorder'])
+            else:
+                gdf.plot(ax=ax, color=THEME[name], linewidth=layer['width'], zorder=layer['zorder'])
+        
+        # Layer 2: Roads with hierarchy coloring
+        print("Applying road hierarchy colors...")
+        edge_colors = get_edge_colors_by_type(G_proj)
+        edge_widths = get_edge_widths_by_type(G_proj)
+
+        # Plot the projected graph and then apply the cropped limits
+        import osmnx as ox
+        existing = set(ax.collections)
+        ox.plot_graph(
+            G_proj, ax=ax, bgcolor=THEME['bg'],
+            node_size=0,
+            edge_color=edge_colors,
+            edge_linewidth=edge_widths,
+            show=False, close=False
+        )
+        # plot_graph has no zorder option and leaves roads at 1, under parks;
+        # lift them above the feature layers as the numpy engine draws them
+        for collection in ax.collections:
+            if collection not in existing:
+                collection.set_zorder(ROAD_ZORDER)
     ax.set_aspect('equal', adjustable='box')
     ax.set_xlim(crop_xlim)
     ax.set_ylim(crop_ylim)
@@ -600,20 +1651,163 @@ def create_poster(city, country, point, dist, output_file, output_format, countr
             color=THEME['text'], alpha=0.5, ha='right', va='bottom', 
             fontproperties=font_attr, zorder=11)
 
-    # 5. Save
-    print(f"Saving to {output_file}...")
+    return fig
+
+def compare_engines(city, country, point, scene, dpi, country_label=None, window=None):
+    """
+    Render the poster with both engines at dpi and compare the pixels.
+    Returns (mean absolute difference, fraction of pixels differing by more
+    than ENGINE_TOLERANCE in any channel).
+    """
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    buffers = {}
+    for engine in ENGINES:
+        fig = draw_poster(city, country, point, scene, engine=engine, dpi=dpi, country_label=country_label, window=window)
+        buffers[engine] = render_raster_buffer(fig, dpi)[..., :3].astype(np.int16)
+        plt.close(fig)
+    diff = np.abs(buffers['numpy'] - buffers['matplotlib'])
+    return float(diff.mean()), float((diff.max(axis=2) > ENGINE_TOLERANCE).mean())
+
+def parse_series(spec):
+    """
+    Parse a zoom series: a comma-separated list of distances in meters
+    ("2000,5000,12000"), or START:END:STEPS for STEPS distances from START
+    to END spaced geometrically, so every frame zooms by the same factor.
+    Raises ValueError for malformed specs.
+    """
+    try:
+        if ':' in spec:
+            start, end, steps = (int(part) for part in spec.split(':'))
+            if steps < 2:
+                raise ValueError
+            ratio = (end / start) ** (1 / (steps - 1))
+            dists = [round(start * ratio ** i) for i in range(steps)]
+        else:
+            dists = [int(part) for part in spec.split(',')]
+    except (ValueError, ZeroDivisionError):
+        raise ValueError(f"invalid series '{spec}' (expected D1,D2,... or START:END:STEPS)") from None
+    if not dists or min(dists) <= 0:
+        raise ValueError(f"invalid series '{spec}': distances must be positive")
+    return dists
+
+def get_frame_window(scene, point, dist):
+    """
+    Crop window of a poster with radius dist centered on point, in the
+    scene's CRS: dist above and below the center, the poster aspect across.
+    """
+    import osmnx as ox
+    from shapely.geometry import Point
 
-    fmt = output_format.lower()
-    save_kwargs = dict(facecolor=THEME["bg"], bbox_inches="tight", pad_inches=0.05,)
+    center, _ = ox.projection.project_geometry(Point(point[1], point[0]), to_crs=scene['graph'].graph['crs'])
+    half_width = dist * POSTER_SIZE[0] / POSTER_SIZE[1]
+    return (center.x - half_width, center.x + half_width), (center.y - dist, center.y + dist)
 
-    # DPI matters mainly for raster formats
-    if fmt == "png":
-        save_kwargs["dpi"] = 300
+def get_detail_scene(scene, detail, levels):
+    """
+    A scene reduced to a detail level, built once per level and kept in
+    levels ({detail: scene}, seeded with the fetched scene's own level).
+    """
+    if detail not in levels:
+        G = filter_graph_detail(scene['graph'].copy(), detail)
+        levels[detail] = {'graph': G, 'layers': scene['layers']}
+    return levels[detail]
+
+def _box_mask(coords, xlim, ylim, left=True):
+    import numpy as np
+
+    x0, y0, x1, y1 = coords.T
+    mask = ((np.minimum(x0, x1) <= xlim[1]) &
+            (np.maximum(y0, y1) >= ylim[0]) & (np.minimum(y0, y1) <= ylim[1]))
+    if left:
+        mask &= np.maximum(x0, x1) >= xlim[0]
+    return mask
+
+def crop_scene(scene, window, engines):
+    """
+    The part of a projected scene a crop window can show, so a zoom series
+    frame only draws what is in view. Roads and features are cropped for
+    the matplotlib engine, coordinate arrays for the numpy engine. Polygon
+    edges left of the window are kept: they still decide which pixels are
+    inside a polygon under the winding rule.
+    """
+    xlim, ylim = window
+    # Lines reaching just into the frame still show their stroke
+    margin = 0.01 * (xlim[1] - xlim[0])
+    outer = ((xlim[0] - margin, xlim[1] + margin), (ylim[0] - margin, ylim[1] + margin))
+    cropped = {'graph': scene['graph'], 'layers': scene['layers']}
+
+    if 'matplotlib' in engines:
+        import osmnx as ox
+
+        if 'edge_bounds' not in scene:
+            edges = ox.graph_to_gdfs(scene['graph'], nodes=False, fill_edge_geometry=True)
+            # (minx, miny, maxx, maxy) works as a segment for _box_mask
+            scene['edge_bounds'] = (list(edges.index), edges.geometry.bounds.to_numpy())
+        keys, bounds = scene['edge_bounds']
+        inside = _box_mask(bounds, *outer)
+        cropped['graph'] = scene['graph'].edge_subgraph([key for key, keep in zip(keys, inside) if keep])
+        cropped['layers'] = {}
+        for name, gdf in scene['layers'].items():
+            part = None if gdf is None else gdf.cx[outer[0][0]:outer[0][1], outer[1][0]:outer[1][1]]
+            cropped['layers'][name] = None if part is None or part.empty else part
+
+    if 'numpy' in engines:
+        arrays = get_scene_arrays(scene)
+        roads = _box_mask(arrays['roads'], *outer)
+        layers = {}
+        for name, coords in arrays['layers'].items():
+            polygon = FEATURE_LAYERS[name]['geometry'] == 'polygon'
+            layers[name] = coords[_box_mask(coords, *outer, left=not polygon)]
+        cropped['arrays'] = {'roads': arrays['roads'][roads], 'road_class': arrays['road_class'][roads], 'layers': layers}
+    return cropped
+
+def create_poster(city, country, point, dist, outputs, country_label=None, name_label=None, encoder=None, scene=None, engine='matplotlib', tiles=1, detail='full', layers=None, window=None):
+    """
+    Fetch, draw and save one poster. outputs is a list of (target, path)
+    pairs as built from parse_output_target(); all of them are written from
+    the same drawn figure.
+
+    With an encoder executor, raster encoding runs in the background and the
+    pending futures are returned so the caller can start the next poster.
+    An already loaded scene can be passed in to skip the cache lookup.
+    engine selects how map layers are drawn: 'matplotlib' artists or the
+    'numpy' raster engine. tiles > 1 fetches missing data in sub-area chunks
+    and detail sets which road classes are fetched and drawn. layers are the
+    feature layers to fetch (default: the ones the current theme draws).
+    window crops the map to an (xlim, ylim) area of the scene.
+    """
+    import matplotlib.pyplot as plt
 
-    plt.savefig(output_file, format=fmt, **save_kwargs)
+    if layers is None:
+        layers = get_theme_layers(THEME)
 
-    plt.close()
-    print(f"✓ Done! Poster saved as {output_file}")
+    print(f"\nGenerating map for {city}, {country}...")
+    
+    with timed('scene'):
+        if scene is None:
+            # The numpy engine only needs the coordinate arrays: map them
+            # instead of unpickling the whole scene
+            scene = (attach_scene if engine == 'numpy' else load_scene)(point, dist, detail, layers)
+        if scene is None:
+            scene = fetch_scene(point, dist, tiles=tiles, detail=detail, layers=layers)
+
+    with timed('draw'):
+        fig = draw_poster(city, country, point, scene, engine=engine, dpi=get_render_dpi(outputs), country_label=country_label, window=window)
+
+    # 5. Save every requested output from this one figure
+    with timed('save'):
+        results = save_outputs(fig, outputs, encoder=encoder)
+
+    plt.close(fig)
+    pending = []
+    for result in results:
+        if isinstance(result, str):
+            print(f"✓ Done! Poster saved as {result}")
+        else:
+            pending.append(result)
+    return pending
 
 
 def print_examples():
@@ -653,6 +1847,15 @@ Examples:
   python create_map_poster.py -c "London" -C "UK" -t noir -d 15000              # Thames curves
   python create_map_poster.py -c "Budapest" -C "Hungary" -t copper_patina -d 8000  # Danube split
   
+  # Print PNG, vector PDF and web thumbnail in one pass
+  python create_map_poster.py -c "Paris" -C "France" -o png -o pdf -o png:thumb400
+
+  # Zoom series: 30 frames from 1 km to 16 km, fetched once
+  python create_map_poster.py -c "Paris" -C "France" --series 1000:16000:30 -o png:600x800
+
+  # Warm the cache for a city list, refreshing entries older than 30 days every hour
+  python create_map_poster.py --prefetch cities.txt --max-age 30 --prefetch-interval 3600
+
   # List themes
   python create_map_poster.py --list-themes
 
@@ -663,7 +1866,32 @@ Options:
   --theme, -t       Theme name (default: feature_based)
   --all-themes      Generate posters for all themes
   --distance, -d    Map radius in meters (default: 29000)
+  --series          Zoom series distances D1,D2,... or START:END:STEPS (overrides --distance)
+  --detail          Road detail: auto, full, streets or arterial (default: auto)
+  --tiles N         Fetch large areas as N x N parallel sub-area queries (default: 1)
+  --format, -f      Output format: png, svg or pdf (default: png)
+  --output, -o      Output target FORMAT[:SIZE], repeatable (overrides --format)
+  --png-compression PNG zlib level 0-9, lower is faster (default: 6)
+  --quality         WebP/JPEG quality 1-100 (default: 90)
+  --encode-workers  Encode raster outputs on N background workers (default: 0)
+  --engine          Map layer renderer: matplotlib or numpy (default: matplotlib)
+  --verify-engine   Compare the numpy engine against matplotlib for each poster
+  --force           Re-render even if an identical poster is already stored
+  --gc              Delete stored posters superseded by newer renders
   --list-themes     List all available themes
+  --timings         Print startup and per-stage timings
+  --prefetch FILE   Warm the cache for a city list ('City, Country[, priority[, distance]]')
+  --prefetch-interval  Keep --prefetch running as a daemon, repeating every N seconds
+  --max-age DAYS    Refetch cache entries older than DAYS during --prefetch
+  --cache-report    Show cache coverage/staleness for --prefetch FILE without fetching
+
+Output targets (all produced from a single render):
+  png               300 DPI PNG
+  png:150dpi        PNG at a specific DPI
+  png:1800x2400     PNG fitted inside a pixel box
+  png:thumb400      400px wide thumbnail
+  webp, jpg         Lossy raster output (sizes work as for png)
+  pdf, svg          Vector output
 
 Distance guide:
   4000-6000m   Small/dense cities (Venice, Amsterdam old center)
@@ -699,6 +1927,142 @@ def list_themes():
             print(f"    {description}")
         print()
 
+PREFETCH_LAYERS = ['graph', 'features', 'scene']
+
+
+def read_city_list(path, default_dist):
+    """
+    Read a prefetch city list. Each line is 'City, Country[, priority[, distance]]';
+    blank lines and lines starting with # are ignored. Entries are returned in
+    priority order (lowest first), ties keeping their order in the file.
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split(',')]
+            if len(parts) < 2 or not parts[0] or not parts[1]:
+                raise ValueError(f"{path}:{line_no}: expected 'City, Country[, priority[, distance]]'")
+            try:
+                priority = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+                dist = int(parts[3]) if len(parts) > 3 and parts[3] else default_dist
+            except ValueError:
+                raise ValueError(f"{path}:{line_no}: priority and distance must be integers") from None
+            entries.append({'city': parts[0], 'country': parts[1], 'priority': priority, 'dist': dist})
+    return sorted(entries, key=lambda entry: entry['priority'])
+
+
+def get_cache_status(entry):
+    """
+    Age in seconds of each cached layer for a city list entry (None if missing).
+    Layers other than 'coords' are unknown until the city has been geocoded.
+    'features' is the combined download of the entry's feature layers.
+    """
+    status = {'coords': cache_age(coords_cache_key(entry['city'], entry['country']))}
+    point = cache_get(coords_cache_key(entry['city'], entry['country']))
+    dist = entry['dist']
+    for layer in PREFETCH_LAYERS:
+        if point is None:
+            status[layer] = None
+        elif layer == 'graph':
+            # Any entry detailed enough to serve this level counts
+            ages = [cache_age(key) for _, key in get_graph_sources(point, dist, entry['detail'])]
+            status[layer] = next((age for age in ages if age is not None), None)
+        elif layer == 'features':
+            tags = combine_layer_tags(entry['layers'])
+            status[layer] = cache_age(features_cache_key(point, dist, tags, "+".join(entry['layers'])))
+        else:
+            status[layer] = cache_age(scene_cache_key(point, dist, entry['detail'], entry['layers']))
+    return status
+
+
+def prefetch_city(entry, max_age=None, tiles=1):
+    """
+    Make sure every cache layer for a city, including its geocode, is
+    present and no older than max_age seconds. Fresh layers are left alone; missing or stale ones are
+    downloaded with the usual rate limiting, then the scene is rebuilt.
+    """
+    city, country, dist = entry['city'], entry['country'], entry['dist']
+    status = get_cache_status(entry)
+
+    def needs_fetch(layer):
+        age = status[layer]
+        return age is None or (max_age is not None and age > max_age)
+
+    # Stale geocodes are looked up again; layer ages are only known (and
+    # their keys may change) once the city is geocoded
+    point = get_coordinates(city, country, refresh=status['coords'] is not None and needs_fetch('coords'))
+    status = get_cache_status(entry)
+
+    stale = [layer for layer in ('graph', 'features') if needs_fetch(layer)]
+    if not stale and not needs_fetch('scene'):
+        print(f"✓ {city}, {country} ({dist}m) is already warm")
+        return
+
+    print(f"Prefetching {city}, {country} ({dist}m, {entry['detail']} detail)...")
+    fetch_scene(point, dist, refresh=stale, tiles=tiles, detail=entry['detail'], layers=entry['layers'])
+
+
+def format_age(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+
+def print_cache_report(entries, max_age=None):
+    """
+    Print cache coverage and staleness for every city list entry.
+    """
+    layers = ['coords'] + PREFETCH_LAYERS
+    cached = stale = 0
+
+    print("\nCache coverage:")
+    print("-" * 60)
+    print(f"  {'city':<28}" + "".join(f"{layer:>10}" for layer in layers))
+    for entry in entries:
+        status = get_cache_status(entry)
+        row = f"  {entry['city'] + ', ' + entry['country']:<28}"
+        for layer in layers:
+            age = status[layer]
+            mark = format_age(age)
+            if age is not None:
+                cached += 1
+                if max_age is not None and age > max_age:
+                    stale += 1
+                    mark += "*"
+            row += f"{mark:>10}"
+        print(row)
+
+    total = len(entries) * len(layers)
+    print("-" * 60)
+    print(f"  {cached}/{total} entries cached, {stale} stale" + (" (* older than max age)" if stale else ""))
+
+
+def run_prefetch(entries, max_age=None, interval=None, tiles=1):
+    """
+    Warm the cache for every entry in priority order, then print a coverage
+    report. With an interval (seconds) keep running as a daemon, re-checking
+    staleness on every pass.
+    """
+    while True:
+        for entry in entries:
+            try:
+                prefetch_city(entry, max_age=max_age, tiles=tiles)
+            except Exception as e:
+                print(f"✗ Prefetch failed for {entry['city']}, {entry['country']}: {e}")
+        print_cache_report(entries, max_age=max_age)
+        if not interval:
+            return
+        print(f"\nNext prefetch pass in {interval}s...")
+        time.sleep(interval)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Generate beautiful map posters for any city",
@@ -708,6 +2072,7 @@ Examples:
   python create_map_poster.py --city "New York" --country "USA"
   python create_map_poster.py --city Tokyo --country Japan --theme midnight_blue
   python create_map_poster.py --city Paris --country France --theme noir --distance 15000
+  python create_map_poster.py --city Paris --country France -o png -o pdf -o png:thumb400
   python create_map_poster.py --list-themes
         """
     )
@@ -718,10 +2083,29 @@ Examples:
     parser.add_argument('--theme', '-t', type=str, default='feature_based', help='Theme name (default: feature_based)')
     parser.add_argument('--all-themes', '--All-themes', dest='all_themes', action='store_true', help='Generate posters for all themes')
     parser.add_argument('--distance', '-d', type=int, default=29000, help='Map radius in meters (default: 29000)')
+    parser.add_argument('--series', metavar='D1,D2,...|START:END:STEPS', help='Zoom series: render numbered posters at several distances from one fetch of the largest area (overrides --distance)')
+    parser.add_argument('--force', action='store_true', help='Re-render even if an identical poster is already in posters/')
+    parser.add_argument('--gc', action='store_true', help='Delete stored posters superseded by newer renders of the same city/theme/size/format')
+    parser.add_argument('--detail', default='auto', choices=['auto'] + list(DETAIL_LEVELS), help='Road detail to fetch and draw: full (everything, incl. footpaths), streets, arterial, or auto from distance and DPI; overrides a theme\'s "detail" (default: auto)')
+    parser.add_argument('--tiles', type=int, default=1, metavar='N', help='Fetch the area as N x N sub-area queries (cached and retried per tile) instead of one large query (default: 1)')
     parser.add_argument('--list-themes', action='store_true', help='List all available themes')
-    parser.add_argument('--format', '-f', default='png', choices=['png', 'svg', 'pdf'],help='Output format for the poster (default: png)')
+    parser.add_argument('--timings', action='store_true', help='Print startup and per-stage timings when done')
+    parser.add_argument('--prefetch', metavar='CITY_LIST', help="Warm the cache for every 'City, Country[, priority[, distance]]' line in CITY_LIST")
+    parser.add_argument('--prefetch-interval', type=int, default=0, metavar='SECONDS', help='Keep running --prefetch as a daemon, repeating every SECONDS')
+    parser.add_argument('--max-age', type=float, metavar='DAYS', help='Treat cache entries older than DAYS as stale (refetched by --prefetch)')
+    parser.add_argument('--cache-report', action='store_true', help='Show cache coverage and staleness for --prefetch CITY_LIST without fetching')
+    parser.add_argument('--format', '-f', default='png', choices=OUTPUT_FORMATS + list(FORMAT_ALIASES),help='Output format for the poster (default: png)')
+    parser.add_argument('--output', '-o', dest='outputs', action='append', metavar='FORMAT[:SIZE]', help='Output target, e.g. png, pdf, png:150dpi, png:1800x2400, png:thumb400. Repeat to produce several from one render (overrides --format)')
+    parser.add_argument('--png-compression', type=int, default=DEFAULT_PNG_COMPRESSION, choices=range(10), metavar='0-9', help=f'PNG zlib compression level; lower is faster, higher is smaller (default: {DEFAULT_PNG_COMPRESSION})')
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help=f'WebP/JPEG quality 1-100 (default: {DEFAULT_QUALITY})')
+    parser.add_argument('--encode-workers', type=int, default=0, help='Encode raster outputs on N background workers so the next poster can start drawing (default: 0, encode inline)')
+    parser.add_argument('--encode-processes', action='store_true', help='Use worker processes instead of threads for --encode-workers')
+    parser.add_argument('--engine', default='matplotlib', choices=ENGINES, help='Renderer for the map layers: matplotlib artists, or the numpy raster engine for large raster posters (default: matplotlib)')
+    parser.add_argument('--verify-engine', action='store_true', help='After each poster, render it with both engines and report how much the numpy output differs')
     
     args = parser.parse_args()
+    # Module import plus argument parsing; heavy libraries are not loaded yet
+    STAGE_TIMINGS['startup'] = time.perf_counter() - _IMPORT_START
     
     # If no arguments provided, show examples
     if len(sys.argv) == 1:
@@ -731,8 +2115,45 @@ Examples:
     # List themes if requested
     if args.list_themes:
         list_themes()
+        if args.timings:
+            print_timings()
         sys.exit(0)
     
+    # Garbage-collect superseded outputs
+    if args.gc:
+        with output_index_lock():
+            index = load_output_index()
+            removed = collect_superseded_outputs(index)
+            save_output_index(index)
+        for path in removed:
+            print(f"  removed {path}")
+        print(f"✓ Removed {len(removed)} superseded poster(s), {len(index)} kept")
+        sys.exit(0)
+
+    if args.tiles < 1:
+        print("Error: --tiles must be at least 1.")
+        sys.exit(1)
+
+    # Prefetch / report on a city list
+    if args.prefetch:
+        max_age = args.max_age * 86400 if args.max_age is not None else None
+        try:
+            entries = read_city_list(args.prefetch, args.distance)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        # Warm every feature layer any installed theme draws
+        layers = normalize_layers([name for theme_name in get_available_themes()
+                                   for name in get_theme_layers(load_theme(theme_name, quiet=True))])
+        for entry in entries:
+            entry['detail'] = resolve_detail(args.detail, {}, entry['dist'], DEFAULT_DPI)
+            entry['layers'] = layers
+        if args.cache_report:
+            print_cache_report(entries, max_age=max_age)
+        else:
+            run_prefetch(entries, max_age=max_age, interval=args.prefetch_interval, tiles=args.tiles)
+        sys.exit(0)
+
     # Validate required arguments
     if not args.city or not args.country:
         print("Error: --city and --country are required.\n")
@@ -752,6 +2173,34 @@ Examples:
             print(f"Available themes: {', '.join(available_themes)}")
             os.sys.exit(1)
         themes_to_generate = [args.theme]
+
+    # One feature fetch serves every theme in this run
+    layers = normalize_layers([name for theme_name in themes_to_generate
+                               for name in get_theme_layers(load_theme(theme_name, quiet=True))])
+
+    try:
+        targets = [parse_output_target(spec) for spec in (args.outputs or [args.format])]
+    except ValueError as e:
+        print(f"Error: {e}")
+        os.sys.exit(1)
+    series = None
+    if args.series:
+        try:
+            series = parse_series(args.series)
+        except ValueError as e:
+            print(f"Error: {e}")
+            os.sys.exit(1)
+    if not 1 <= args.quality <= 100:
+        print("Error: --quality must be between 1 and 100.")
+        os.sys.exit(1)
+    for target in targets:
+        target['png_compression'] = args.png_compression
+        target['quality'] = args.quality
+
+    encoder = None
+    if args.encode_workers > 0:
+        pool = ProcessPoolExecutor if args.encode_processes else ThreadPoolExecutor
+        encoder = pool(max_workers=args.encode_workers)
     
     print("=" * 50)
     print("City Map Poster Generator")
@@ -759,15 +2208,97 @@ Examples:
     
     # Get coordinates and generate poster
     try:
-        coords = get_coordinates(args.city, args.country)
+        with timed('geocode'):
+            coords = get_coordinates(args.city, args.country)
+
+        # Highest DPI over all targets, vector ones included: it drives both the
+        # numpy raster and the auto detail level, which must suit the print output
+        render_dpi = get_render_dpi([(target, None) for target in targets])
+        index = load_output_index()
+        # A zoom series renders every distance from one fetch of the largest area
+        frames = series or [args.distance]
+        fetch_dist = max(frames)
+        scenes = {}
+        series_levels = {}
+        rendered = {}
+        pending = []
         for theme_name in themes_to_generate:
             THEME = load_theme(theme_name)
-            output_file = generate_output_filename(args.city, theme_name, args.format)
-            create_poster(args.city, args.country, coords, args.distance, output_file, args.format, country_label=args.country_label)
+            frame_details = [resolve_detail(args.detail, THEME, dist, render_dpi) for dist in frames]
+            # Fetch at the most detailed level any frame needs
+            detail = min(frame_details, key=list(DETAIL_LEVELS).index)
+            print(f"Detail level: {detail}")
+
+            # Fingerprints include the data version, so make sure the data exists first
+            if detail not in scenes and get_data_version(coords, fetch_dist, detail, layers) is None:
+                with timed('scene'):
+                    scenes[detail] = fetch_scene(coords, fetch_dist, tiles=args.tiles, detail=detail, layers=layers)
+            data_version = get_data_version(coords, fetch_dist, detail, layers)
+
+            for number, (dist, frame_detail) in enumerate(zip(frames, frame_details), 1):
+                # Series frames are identified by their number too, so each
+                # series gets its own consecutively numbered files
+                frame = (number, fetch_dist) if series else None
+                outputs = []
+                for target in targets:
+                    fingerprint = poster_fingerprint(args.city, args.country, coords, dist, theme_name, target, data_version, country_label=args.country_label, engine=args.engine, detail=frame_detail, frame=frame)
+                    existing = None if args.force else lookup_output(index, fingerprint)
+                    if existing:
+                        print(f"✓ Identical poster already exists: {existing}")
+                        continue
+                    suffix = output_target_suffix(target)
+                    path = generate_output_filename(args.city, theme_name, target['format'], suffix=suffix, fingerprint=fingerprint, frame=number if series else None)
+                    outputs.append((target, path))
+                    rendered[fingerprint] = {
+                        'path': path,
+                        'slot': poster_slot(args.city, args.country, dist, theme_name, target, args.country_label, frame),
+                        'city': args.city, 'theme': theme_name,
+                    }
+                if not outputs:
+                    continue
+                if detail not in scenes:
+                    with timed('scene'):
+                        if args.engine == 'numpy' and not args.verify_engine and not series:
+                            # Only the coordinate arrays are needed: map them shared, read-only
+                            scenes[detail] = attach_scene(coords, fetch_dist, detail, layers)
+                        else:
+                            scenes[detail] = load_scene(coords, fetch_dist, detail, layers)
+                scene = scenes[detail]
+                window = None
+                if series:
+                    # Frames only change the crop window and detail level
+                    print(f"\nFrame {number}/{len(frames)}: {dist}m, {frame_detail} detail")
+                    with timed('crop'):
+                        levels = series_levels.setdefault(detail, {detail: scene})
+                        window = get_frame_window(scene, coords, dist)
+                        engines = ENGINES if args.verify_engine else [args.engine]
+                        scene = crop_scene(get_detail_scene(scene, frame_detail, levels), window, engines)
+                pending.extend(create_poster(args.city, args.country, coords, dist, outputs, country_label=args.country_label, encoder=encoder, scene=scene, engine=args.engine, tiles=args.tiles, detail=frame_detail, layers=layers, window=window))
+                if args.verify_engine:
+                    mean_diff, differing = compare_engines(args.city, args.country, coords, scene, get_render_dpi(outputs), country_label=args.country_label, window=window)
+                    print(f"Engine check ({theme_name}): mean difference {mean_diff:.2f}/255, "
+                          f"{differing:.2%} of pixels differ by more than {ENGINE_TOLERANCE}")
+
+        with timed('encode wait'):
+            for future in pending:
+                print(f"✓ Done! Poster saved as {future.result()}")
+            if encoder is not None:
+                encoder.shutdown()
+
+        if rendered:
+            created = datetime.now().isoformat(timespec='seconds')
+            with output_index_lock():
+                # Merge into the current index; other runs may have added entries
+                index = load_output_index()
+                for fingerprint, entry in rendered.items():
+                    index[fingerprint] = dict(entry, created=created)
+                save_output_index(index)
         
         print("\n" + "=" * 50)
         print("✓ Poster generation complete!")
         print("=" * 50)
+        if args.timings:
+            print_timings()
         
     except Exception as e:
         print(f"\n✗ Error: {e}")
@@ -0,0 +1,214 @@
+"""
+NumPy raster engine for map layers.
+
+Draws antialiased road segments and filled polygons straight into an RGBA
+buffer, bypassing per-artist matplotlib overhead. Everything works on
+projected coordinate arrays:
+
+  segments  (N, 4) float array of x0, y0, x1, y1 line segments
+  edges     (M, 4) float array of polygon ring edges, exteriors and holes
+            oriented oppositely so the nonzero winding rule cuts the holes
+
+Coordinates are mapped onto the canvas with a (xlim, ylim) data window,
+matching what matplotlib would show for the same axes limits.
+"""
+import numpy as np
+import matplotlib.colors as mcolors
+
+# Sub-scanlines per pixel row when filling polygons (vertical antialiasing)
+POLYGON_SUBSAMPLES = 4
+# Longest line piece in pixels; longer segments are split to keep their
+# bounding boxes tight
+LINE_PIECE_LENGTH = 8
+# Upper bound on temporary array sizes, to keep memory flat for huge layers
+CHUNK_ELEMENTS = 4_000_000
+
+
+def new_canvas(width, height, color):
+    """
+    Create a float RGB canvas filled with a background color.
+    """
+    canvas = np.empty((height, width, 3), dtype=np.float32)
+    canvas[:] = mcolors.to_rgb(color)
+    return canvas
+
+
+def to_rgba(canvas):
+    """
+    Convert a float RGB canvas to an opaque uint8 RGBA buffer.
+    """
+    height, width, _ = canvas.shape
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., :3] = np.clip(canvas * 255 + 0.5, 0, 255)
+    rgba[..., 3] = 255
+    return rgba
+
+
+def to_pixels(coords, xlim, ylim, width, height):
+    """
+    Map (N, 4) data-space segments/edges to pixel space (y pointing down).
+    """
+    sx = width / (xlim[1] - xlim[0])
+    sy = height / (ylim[1] - ylim[0])
+    out = np.empty_like(coords, dtype=np.float64)
+    out[:, 0] = (coords[:, 0] - xlim[0]) * sx
+    out[:, 2] = (coords[:, 2] - xlim[0]) * sx
+    out[:, 1] = (ylim[1] - coords[:, 1]) * sy
+    out[:, 3] = (ylim[1] - coords[:, 3]) * sy
+    return out
+
+
+def composite(canvas, coverage, color, alpha=1.0):
+    """
+    Blend a solid color into the canvas using a (H, W) coverage mask.
+    """
+    a = coverage[..., None] * alpha
+    canvas *= 1 - a
+    canvas += a * np.asarray(mcolors.to_rgb(color), dtype=np.float32)
+
+
+def polygon_coverage(edges, width, height, subsamples=POLYGON_SUBSAMPLES):
+    """
+    Antialiased coverage of filled polygons given as pixel-space ring edges.
+
+    Each edge adds its winding direction where it crosses a sub-scanline,
+    split between the two pixels around the crossing for horizontal
+    antialiasing; a cumulative sum along each row then yields the winding
+    number, i.e. coverage.
+    """
+    stride = width + 2
+    acc = np.zeros(height * stride, dtype=np.float32)
+
+    x0, y0, x1, y1 = edges.T
+    direction = np.sign(y1 - y0)
+    keep = direction != 0
+    x0, y0, x1, y1, direction = x0[keep], y0[keep], x1[keep], y1[keep], direction[keep]
+
+    # Sub-scanline k sits at y = (k + 0.5) / subsamples; an edge crosses
+    # every k with ylo <= y < yhi
+    rows = height * subsamples
+    k_start = np.clip(np.ceil(np.minimum(y0, y1) * subsamples - 0.5), 0, rows).astype(np.int64)
+    k_end = np.clip(np.ceil(np.maximum(y0, y1) * subsamples - 0.5), 0, rows).astype(np.int64)
+    counts = np.maximum(k_end - k_start, 0)
+
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    start = 0
+    while start < len(counts):
+        # Take as many edges as fit in one chunk (at least one)
+        stop = max(np.searchsorted(bounds, bounds[start] + CHUNK_ELEMENTS, side='right') - 1, start + 1)
+        chunk_counts = counts[start:stop]
+        total = int(chunk_counts.sum())
+        if total:
+            edge = np.repeat(np.arange(start, stop), chunk_counts)
+            first = np.repeat(bounds[start:stop] - bounds[start], chunk_counts)
+            k = k_start[edge] + (np.arange(total) - first)
+
+            y = (k + 0.5) / subsamples
+            t = (y - y0[edge]) / (y1[edge] - y0[edge])
+            x = np.clip(x0[edge] + t * (x1[edge] - x0[edge]), 0, width)
+            ix = np.floor(x).astype(np.int64)
+            frac = x - ix
+            weight = direction[edge] / subsamples
+            flat = (k // subsamples) * stride + ix
+
+            np.add.at(acc, flat, weight * (1 - frac))
+            np.add.at(acc, flat + 1, weight * frac)
+        start = stop
+
+    winding = np.cumsum(acc.reshape(height, stride), axis=1)[:, :width]
+    return np.clip(np.abs(winding), 0, 1).astype(np.float32)
+
+
+def line_coverage(segments, line_width, width, height):
+    """
+    Antialiased coverage of round-capped lines of line_width pixels.
+
+    Segments longer than LINE_PIECE_LENGTH pixels are split, so bounding
+    boxes stay tight around diagonal lines. Every pixel in a piece's
+    bounding box (grown by the line radius) then gets its exact distance to
+    the piece, with a one pixel linear falloff at the line edge. Pieces with
+    equally sized boxes are evaluated together. Overlaps keep the maximum
+    coverage.
+    """
+    coverage = np.zeros(height * width, dtype=np.float32)
+    half = line_width / 2
+    reach = half + 0.5
+
+    # Drop segments entirely outside the canvas
+    x0, y0, x1, y1 = segments.T
+    visible = ((np.maximum(x0, x1) >= -reach) & (np.minimum(x0, x1) <= width + reach) &
+               (np.maximum(y0, y1) >= -reach) & (np.minimum(y0, y1) <= height + reach))
+    x0, y0, x1, y1 = x0[visible], y0[visible], x1[visible], y1[visible]
+    if not len(x0):
+        return coverage.reshape(height, width)
+
+    # Split long segments into equal pieces
+    dx, dy = x1 - x0, y1 - y0
+    pieces = np.maximum(np.ceil(np.hypot(dx, dy) / LINE_PIECE_LENGTH), 1).astype(np.int64)
+    seg = np.repeat(np.arange(len(x0)), pieces)
+    step = np.arange(len(seg)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    t0 = step / pieces[seg]
+    t1 = (step + 1) / pieces[seg]
+    ax, ay = x0[seg] + t0 * dx[seg], y0[seg] + t0 * dy[seg]
+    bx, by = x0[seg] + t1 * dx[seg], y0[seg] + t1 * dy[seg]
+
+    # Pixel bounding box of each piece, clipped to the canvas
+    left = np.clip(np.floor(np.minimum(ax, bx) - reach), 0, width).astype(np.int64)
+    right = np.clip(np.ceil(np.maximum(ax, bx) + reach), 0, width).astype(np.int64)
+    top = np.clip(np.floor(np.minimum(ay, by) - reach), 0, height).astype(np.int64)
+    bottom = np.clip(np.ceil(np.maximum(ay, by) + reach), 0, height).astype(np.int64)
+    box_width = right - left
+    box_height = bottom - top
+    nonempty = (box_width > 0) & (box_height > 0)
+
+    # Pieces with the same box shape are handled together, broadcasting over
+    # (piece, row, column) instead of gathering per-pixel coordinates
+    ax, ay = (ax - left).astype(np.float32), (ay - top).astype(np.float32)
+    ux, uy = (bx - left).astype(np.float32) - ax, (by - top).astype(np.float32) - ay
+    length2 = ux * ux + uy * uy
+    inv_length2 = np.divide(1, length2, out=np.zeros_like(length2), where=length2 > 0)
+    shape = box_height * (width + 1) + box_width
+    order = np.argsort(np.where(nonempty, shape, -1), kind='stable')
+    order = order[nonempty[order]]
+    shapes, first = np.unique(shape[order], return_index=True)
+    for group_shape, group in zip(shapes, np.split(order, first[1:])):
+        rows, cols = divmod(int(group_shape), width + 1)
+        per_chunk = max(CHUNK_ELEMENTS // (rows * cols), 1)
+        row_offsets = np.arange(rows, dtype=np.float32)[:, None] + 0.5
+        col_offsets = np.arange(cols, dtype=np.float32)[None, :] + 0.5
+        flat_offsets = (np.arange(rows)[:, None] * width + np.arange(cols)[None, :]).ravel()
+        for chunk_start in range(0, len(group), per_chunk):
+            sel = group[chunk_start:chunk_start + per_chunk]
+            # Pixel centers relative to each piece's start point
+            px = col_offsets - ax[sel, None, None]
+            py = row_offsets - ay[sel, None, None]
+            sx, sy = ux[sel, None, None], uy[sel, None, None]
+            t = np.clip((px * sx + py * sy) * inv_length2[sel, None, None], 0, 1)
+            dist = np.hypot(px - t * sx, py - t * sy)
+            value = np.clip(half + 0.5 - dist, 0, 1).reshape(len(sel), -1)
+
+            index = (top[sel] * width + left[sel])[:, None] + flat_offsets
+            inside = value > 0
+            np.maximum.at(coverage, index[inside], value[inside])
+
+    return coverage.reshape(height, width)
+
+
+def render_layers(width, height, xlim, ylim, background, polygon_layers, line_layers):
+    """
+    Rasterize map layers into an RGBA buffer.
+
+    polygon_layers and line_layers are lists drawn in order, bottom first:
+      polygon layer: (edges, color)
+      line layer:    (segments, color, line_width_px)
+    """
+    canvas = new_canvas(width, height, background)
+    for edges, color in polygon_layers:
+        if len(edges):
+            pixels = to_pixels(edges, xlim, ylim, width, height)
+            composite(canvas, polygon_coverage(pixels, width, height), color)
+    for segments, color, line_width in line_layers:
+        if len(segments):
+            pixels = to_pixels(segments, xlim, ylim, width, height)
+            composite(canvas, line_coverage(pixels, line_width, width, height), color)
+    return to_rgba(canvas)
@@ -0,0 +1,206 @@
+"""
+Render job queue for the Streamlit app.
+
+Posters are rendered in a bounded pool of worker processes instead of the
+Streamlit script thread, so sessions stay responsive and total CPU stays
+bounded however many users press generate at once. Identical jobs share one
+render: submitting a job that is queued, running or already done returns
+the existing job instead of starting another.
+
+Workers are spawned (not forked from the multithreaded Streamlit server)
+and import osmnx/matplotlib once at startup, so each job only pays for its
+download and drawing. Downloaded street networks go through the same
+single-flight disk cache as the command line, shared by all workers.
+"""
+import os
+import json
+import threading
+from hashlib import sha256
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+MAX_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+OUTPUT_DIR = "posters"
+OUTPUT_DPI = 150
+# Finished jobs remembered by the queue; older ones are answered from disk
+MAX_FINISHED_JOBS = 100
+
+# Job stages reported through the shared progress dict
+STAGES = ["queued", "downloading", "rendering", "saving", "done"]
+
+
+def _init_worker(user_agent):
+    """
+    Warm a worker process: load the heavy libraries before the first job.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import osmnx as ox
+
+    ox.settings.user_agent = user_agent
+    ox.settings.requests_timeout = 60
+
+
+def get_map_data(point, radius, network_type):
+    """
+    Street network around point, from the shared on-disk cache. Jobs that
+    differ only in title or theme, in any worker, download the area once.
+    """
+    import osmnx as ox
+    from create_map_poster import cache_get_or_fetch
+
+    lat, lon = point
+    key = f"app_graph_{lat}_{lon}_{radius}_{network_type}"
+    G, _ = cache_get_or_fetch(key, lambda: ox.graph_from_point(
+        point, dist=radius, dist_type='bbox', network_type=network_type, retain_all=True))
+    return G
+
+
+def space_out_text(text, spacing=1):
+    if not text: return ""
+    return (" " * spacing).join(list(text))
+
+
+def render_poster(G, theme, city_text, sub_text, font_path=None):
+    import osmnx as ox
+    import matplotlib.font_manager as fm
+
+    fig, ax = ox.plot_graph(
+        G, node_size=0, edge_color=theme["edge"], edge_linewidth=0.4,
+        bgcolor=theme["bg"], figsize=(12, 16), show=False, close=False
+    )
+
+    font_prop = fm.FontProperties(fname=font_path) if font_path else None
+
+    # 主标题
+    ax.text(0.5, 0.12, space_out_text(city_text, 1), transform=ax.transAxes,
+            ha='center', va='center', fontsize=40, color=theme["text"],
+            fontproperties=font_prop, alpha=0.9)
+
+    # 副标题
+    if sub_text and sub_text.strip() != "":
+        ax.text(0.5, 0.08, space_out_text(sub_text, 1), transform=ax.transAxes,
+                ha='center', va='center', fontsize=12, color=theme["text"],
+                fontproperties=font_prop, alpha=0.7)
+
+    ax.axhline(y=0.15, xmin=0.3, xmax=0.7, color=theme["edge"], linewidth=1, alpha=0.5)
+    return fig
+
+
+def job_id(params):
+    """
+    Identity of a render job: a digest of everything that affects the poster.
+    """
+    return sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def result_path(job):
+    return os.path.join(OUTPUT_DIR, f"app_{job}.png")
+
+
+def run_job(job, params, progress):
+    """
+    Render one poster in a worker process and return the saved PNG path.
+    progress is a shared dict updated with the job's current stage.
+    """
+    import matplotlib.pyplot as plt
+
+    progress[job] = "downloading"
+    G = get_map_data(tuple(params["point"]), params["radius"], params["network_type"])
+
+    progress[job] = "rendering"
+    fig = render_poster(G, params["theme"], params["title"], params["subtitle"], params.get("font_path"))
+
+    progress[job] = "saving"
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    path = result_path(job)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, format="png", dpi=OUTPUT_DPI, bbox_inches='tight', facecolor=params["theme"]["bg"])
+    plt.close(fig)
+    os.replace(tmp_path, path)
+
+    progress[job] = "done"
+    return path
+
+
+class JobQueue:
+    """
+    Local render queue backed by a pool of warm worker processes.
+
+    submit() returns a job id at once; status() reports its stage, and the
+    result path or error once it finishes. One queue is shared by all
+    sessions of the app. Only the last MAX_FINISHED_JOBS finished jobs are
+    kept in memory; older results are found by their file on disk.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, user_agent="art-map-poster"):
+        self._context = multiprocessing.get_context("spawn")
+        self._manager = self._context.Manager()
+        self._progress = self._manager.dict()
+        self._max_workers = max_workers
+        self._user_agent = user_agent
+        self._pool = self._start_pool()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _start_pool(self):
+        return ProcessPoolExecutor(max_workers=self._max_workers, mp_context=self._context,
+                                   initializer=_init_worker, initargs=(self._user_agent,))
+
+    def submit(self, params):
+        """
+        Queue a render and return its job id. A job with the same parameters
+        that is in flight or finished successfully is reused, not re-run.
+        """
+        job = job_id(params)
+        with self._lock:
+            self._evict_finished()
+            future = self._jobs.get(job)
+            if future is not None and not self._needs_rerun(future):
+                return job
+            if future is None and os.path.exists(result_path(job)):
+                # Finished long ago and evicted; the poster is still on disk
+                return job
+            self._progress[job] = "queued"
+            try:
+                future = self._pool.submit(run_job, job, params, self._progress)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); replace the pool
+                self._pool = self._start_pool()
+                future = self._pool.submit(run_job, job, params, self._progress)
+            # Re-insert so the dict stays in submission order for eviction
+            self._jobs.pop(job, None)
+            self._jobs[job] = future
+        return job
+
+    def _evict_finished(self):
+        # Keep only the most recent MAX_FINISHED_JOBS finished jobs in memory
+        finished = [job for job, future in self._jobs.items() if future.done()]
+        for job in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self._jobs[job]
+            self._progress.pop(job, None)
+
+    @staticmethod
+    def _needs_rerun(future):
+        # Failed jobs and results whose file has since been removed
+        if not future.done():
+            return False
+        return future.exception() is not None or not os.path.exists(future.result())
+
+    def status(self, job):
+        """
+        State of a job as a dict: 'stage' (one of STAGES, or 'error'), plus
+        'path' when done or 'error' when it failed. None for unknown jobs.
+        """
+        future = self._jobs.get(job)
+        if future is None:
+            path = result_path(job)
+            return {"stage": "done", "path": path} if os.path.exists(path) else None
+        if not future.done():
+            return {"stage": self._progress.get(job, "queued")}
+        error = future.exception()
+        if error is not None:
+            return {"stage": "error", "error": str(error)}
+        return {"stage": "done", "path": future.result()}
@@ -0,0 +1,62 @@
+"""
+Stress test for the process-safe cache: many processes and threads asking
+for the same missing keys must trigger exactly one fetch per key, and every
+caller must read a complete value.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import create_map_poster  # noqa: E402
+
+KEYS = [f"stress_{i}" for i in range(5)]
+CALLERS = 16
+VALUE_SIZE = 200_000
+
+
+def fetch_all(cache_dir, log_dir):
+    """Request every key once, logging each fetch that actually runs."""
+    create_map_poster.CACHE_DIR = cache_dir
+
+    def fetch(key):
+        with open(os.path.join(log_dir, f"{key}.log"), "a") as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(0.2)
+        return list(range(VALUE_SIZE))
+
+    for key in KEYS:
+        value, _ = create_map_poster.cache_get_or_fetch(key, lambda: fetch(key))
+        assert len(value) == VALUE_SIZE
+
+
+def fetch_counts(log_dir):
+    counts = {}
+    for key in KEYS:
+        with open(os.path.join(log_dir, f"{key}.log")) as f:
+            counts[key] = len(f.read().split())
+    return counts
+
+
+def run_callers(pool, tmp_path):
+    cache_dir, log_dir = tmp_path / "cache", tmp_path / "log"
+    log_dir.mkdir()
+    with pool(max_workers=8) as executor:
+        futures = [executor.submit(fetch_all, str(cache_dir), str(log_dir)) for _ in range(CALLERS)]
+        for future in futures:
+            future.result()
+    assert fetch_counts(log_dir) == {key: 1 for key in KEYS}
+    # Atomic writes leave no temporary files behind
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+
+def test_single_flight_across_processes(tmp_path):
+    run_callers(ProcessPoolExecutor, tmp_path)
+
+
+def test_single_flight_across_threads(tmp_path, monkeypatch):
+    # Threads point this process's CACHE_DIR at tmp_path; restore it afterwards
+    monkeypatch.setattr(create_map_poster, "CACHE_DIR", create_map_poster.CACHE_DIR)
+    run_callers(ThreadPoolExecutor, tmp_path)